@@ -0,0 +1,168 @@
+"""
+Benchmarks of the hot paths against a local stand-in WebUntis server.
+
+usage (from repository root):
+    python -m benchmarks.bench
+    python -m benchmarks.bench --classes 50 500 --latency 0.01 --json result.json
+    python -m benchmarks.bench --compare result.json
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import pendulum
+from pyWebUntis import limiter, network, search, storage, transport
+from benchmarks.fakeserver import FakeServer, Payloads
+
+
+
+
+def measure(function, repeat: int) -> list[float]:
+    """
+    calls function repeat times
+    :return: list of seconds
+    """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def benchmarks(server: FakeServer, payloads: Payloads) -> dict:
+    """
+    creates benchmarks for one school size
+    :return: dict {name: function}
+    """
+
+    school = storage.School(server=server.host, loginName="bench-0")
+    klassen = [klasse["id"] for klasse in school.masterData["klassen"]]
+    sample = klassen[:20]
+    today = pendulum.today()
+
+    # raw periods of one week of every class, for parsing without network
+    monday, sunday = school.api._getMoSofromDate(today)
+    week = [period for ID in klassen
+            for period in payloads.timetable({"startDate": f"{monday:%Y-%m-%d}", "endDate": f"{sunday:%Y-%m-%d}",
+                                              "id": ID})["timetable"]["periods"]]
+
+    def stunde():
+        for period in week:
+            storage.Stunde(school, school.api, period)
+
+    def stunde_resolve():
+        for period in week:
+            hour = storage.Stunde(school, school.api, period)
+            hour.klasse, hour.teacher, hour.subject, hour.room
+
+    def timetable_week():
+        for ID in sample:
+            school.get_timetable_week(ID, "CLASS", today)
+
+    def timetable_range():
+        school.get_timetable_range(klassen[0], "CLASS", today, today.add(weeks=12))
+
+    def next_weeks(workers):
+        return lambda: list(school.find_next_school_week(klassen[0], "CLASS", iter=True, workers=workers))
+
+    def search_cold():
+        search.default = search.SchoolSearch()
+        storage.search_school("bench")
+
+    def search_warm():
+        storage.search_school("bench 1")
+
+    return {
+        "School.__init__": lambda: storage.School(server=server.host, loginName="bench-0"),
+        f"Stunde x{len(week)}": stunde,
+        f"Stunde+resolve x{len(week)}": stunde_resolve,
+        f"get_timetable_week x{len(sample)}": timetable_week,
+        "get_timetable_range 12 weeks": timetable_range,
+        "find_next_school_week(iter=True)": next_weeks(1),
+        "find_next_school_week(iter=True, workers=4)": next_weeks(4),
+        "search_school cold": search_cold,
+        "search_school warm": search_warm,
+    }
+
+
+def run(classes: list[int], latency: float, repeat: int) -> dict:
+    """
+    runs all benchmarks for all school sizes
+    :return: dict {classes: {name: {min, median, requests}}}
+    """
+
+    results = {}
+    for size in classes:
+        payloads = Payloads(classes=size)
+
+        with FakeServer(payloads, latency=latency) as server:
+            network.API.scheme = "http"
+            search.SchoolSearch.url = server.search_url
+            # measures the client, not the politeness of the rate limit
+            transport.Transport.for_server(server.host, limiter=limiter.Limiter(rate=None))
+
+            results[size] = {}
+            for name, function in benchmarks(server, payloads).items():
+                requests = server.requests
+                times = measure(function, repeat)
+
+                results[size][name] = {
+                    "min": min(times) * 1000,
+                    "median": statistics.median(times) * 1000,
+                    "requests": (server.requests - requests) / repeat,
+                }
+
+    return results
+
+
+def report(results: dict, baseline: dict = None):
+    """
+    prints results as table, with change to baseline if given
+    """
+
+    print(f"{'classes':>7}  {'benchmark':<46} {'min ms':>10} {'median ms':>10} {'requests':>9}"
+          + (f" {'vs base':>8}" if baseline else ""))
+
+    for size, benches in results.items():
+        for name, result in benches.items():
+            line = (f"{size:>7}  {name:<46} {result['min']:>10.2f} {result['median']:>10.2f}"
+                    f" {result['requests']:>9.1f}")
+
+            base = (baseline or {}).get(f"{size}", {}).get(name)
+            if base:
+                line += f" {(result['min'] / base['min'] - 1) * 100:>+7.1f}%"
+
+            print(line)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classes", type=int, nargs="+", default=[50, 200, 500], help="klassen per school")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per request of fake server")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--json", help="write results to file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    args = parser.parse_args()
+
+    results = run(args.classes, args.latency, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    report(results, baseline)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
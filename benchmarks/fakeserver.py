@@ -0,0 +1,265 @@
+"""
+Local stand-in for a WebUntis server.
+Serves jsonrpc_intern.do, schoolquery2 and the /WebUntis/api/rest/view/... endpoints
+from synthetic payloads with configurable size and latency.
+"""
+
+import datetime
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+
+
+
+class Payloads:
+    """
+    Synthetic school with `classes` klassen, timetable of every class has `periods` periods per day
+    """
+
+    # shared secret of every user, base32
+    secret = "JBSWY3DPEHPK3PXP"
+
+    def __init__(self, classes: int = 50, periods: int = 8, schools: int = 30, seed: int = 1):
+        self.classes = classes
+        self.periods = periods
+        self.schools = schools
+        self.random = random.Random(seed)
+
+        today = datetime.date.today()
+        self.masterData = {
+            "timeStamp": 1,
+            "klassen": [{"id": 1000 + i, "name": f"{5 + i % 8}{chr(97 + i // 8 % 26)}{i // 208 or ''}",
+                         "longName": f"Klasse {i}", "active": True} for i in range(classes)],
+            "teachers": [{"id": 2000 + i, "name": f"T{i:03}", "firstName": f"First{i}", "lastName": f"Last{i}"}
+                         for i in range(classes * 2)],
+            "rooms": [{"id": 3000 + i, "name": f"R{i:03}", "longName": f"Raum {i}"} for i in range(classes)],
+            "subjects": [{"id": 4000 + i, "name": f"S{i:02}", "longName": f"Fach {i}"} for i in range(30)],
+            "departments": [],
+            "schoolyears": [{
+                "id": 1,
+                "name": f"{today.year}/{today.year + 1}",
+                "startDate": f"{today - datetime.timedelta(days=120):%Y-%m-%d}",
+                "endDate": f"{today + datetime.timedelta(days=240):%Y-%m-%d}",
+            }],
+        }
+        self._timetables = {}
+
+
+    def school(self, host: str, i: int = 0) -> dict:
+        return {
+            "server": host,
+            "useMobileServiceUrlAndroid": True,
+            "address": f"Street {i}, City",
+            "displayName": f"Gymnasium Bench {i}",
+            "loginName": f"bench-{i}",
+            "schoolId": 100000 + i,
+            "serverUrl": f"http://{host}/WebUntis/?school=bench-{i}",
+            "mobileServiceUrl": None,
+        }
+
+
+    def user_data(self) -> dict:
+        return {
+            "masterData": self.masterData,
+            "userData": {"elemType": None, "elemId": 0, "displayName": "anonymous", "rights": []},
+            "settings": {"showAbsenceReason": False},
+        }
+
+
+    def _periods(self, ID: int, day: datetime.date) -> list[dict]:
+        """
+        periods of a class on one day, cached so every request for a day returns the same data
+        """
+
+        key = (ID, day)
+        if key not in self._timetables:
+            periods = []
+            for hour in range(self.periods):
+                start = datetime.datetime.combine(day, datetime.time(7, 45)) + datetime.timedelta(minutes=50 * hour)
+                end = start + datetime.timedelta(minutes=45)
+                state = "CANCELLED" if self.random.random() < 0.05 else "STANDARD"
+
+                periods.append({
+                    "id": hash(key) % 10 ** 8 * 10 + hour,
+                    "lessonId": 5000 + hour,
+                    "startDateTime": f"{start:%Y-%m-%dT%H:%M}Z",
+                    "endDateTime": f"{end:%Y-%m-%dT%H:%M}Z",
+                    "foreColor": "#000000",
+                    "backColor": "#f49f25",
+                    "innerForeColor": "#000000",
+                    "backColorAttribute": None,
+                    "elements": [
+                        {"type": "CLASS", "id": ID, "orgId": 0, "missing": False, "state": "REGULAR"},
+                        {"type": "TEACHER", "id": 2000 + self.random.randrange(self.classes * 2), "orgId": 0,
+                         "missing": False, "state": "REGULAR"},
+                        {"type": "SUBJECT", "id": 4000 + self.random.randrange(30), "orgId": 0,
+                         "missing": False, "state": "REGULAR"},
+                        {"type": "ROOM", "id": 3000 + self.random.randrange(self.classes), "orgId": 0,
+                         "missing": False, "state": "REGULAR"},
+                    ],
+                    "can": [],
+                    "is": [state],
+                    "homeWorks": [],
+                    "exam": None,
+                    "isOnlinePeriod": False,
+                    "blockHash": None,
+                    "text": {"lesson": "", "substitution": "", "info": ""},
+                })
+            self._timetables[key] = periods
+
+        return self._timetables[key]
+
+
+    def timetable(self, params: dict) -> dict:
+        start = datetime.date.fromisoformat(params["startDate"])
+        end = datetime.date.fromisoformat(params["endDate"])
+        ID = int(params["id"])
+
+        periods = []
+        day = start
+        while day <= end:
+            day.weekday() < 5 and periods.extend(self._periods(ID, day))
+            day += datetime.timedelta(days=1)
+
+        return {
+            "timetable": {
+                "displayableStartDate": params["startDate"],
+                "displayableEndDate": params["endDate"],
+                "periods": periods,
+            },
+            "masterData": {"timeStamp": self.masterData["timeStamp"]},
+        }
+
+
+    def check(self, auth: dict) -> bool:
+        """
+        checks otp of auth block, anonymous users need none
+        """
+
+        if auth.get("user") in (None, "", "#anonymous#"):
+            return True
+
+        # imported here, payloads stay usable without the package
+        from pyWebUntis.auth import otp
+        return auth.get("otp") == otp(self.secret, auth["clientTime"])
+
+
+    def call(self, method: str, params: dict):
+        if method == "getAppSharedSecret":
+            return self.secret
+        if method == "getUserData2017":
+            return self.user_data()
+        if method == "getTimetable2017":
+            return self.timetable(params)
+        if method == "getColors2017":
+            return {"appcolors": [{"type": "STANDARD", "foreColor": "#000000", "backColor": "#f49f25"}]}
+        if method in ("getMessagesOfDay2017", "getExams2017", "getHomeWork2017"):
+            return {"messages": [], "exams": [], "homeWorks": [], "lessons": []}
+
+        raise KeyError(method)
+
+
+
+
+class FakeServer:
+    """
+    Threaded http server answering like WebUntis.
+    usage:
+        with FakeServer(Payloads(classes=200), latency=0.02) as server:
+            network.API.scheme = "http"
+            search.SchoolSearch.url = server.search_url
+            School(server=server.host, loginName="bench-0")
+    """
+
+    def __init__(self, payloads: Payloads, latency: float = 0.0):
+        """
+        :param payloads: synthetic data
+        :param latency: seconds every request gets delayed
+        """
+
+        self.payloads = payloads
+        self.latency = latency
+        self.requests = 0
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _answer(self, data, etag: str = None):
+                body = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("content-type", "application/json")
+                etag and self.send_header("etag", etag)
+                self.send_header("content-length", f"{len(body)}")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                server.requests += 1
+                server.latency and time.sleep(server.latency)
+
+                body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+                path = urllib.parse.urlparse(self.path).path
+
+                if path == "/schoolquery2":
+                    search = body["params"][0]["search"]
+                    schools = [server.payloads.school(server.host, i) for i in range(server.payloads.schools)]
+                    return self._answer({"id": body["id"], "jsonrpc": "2.0", "result": {"schools": [
+                        school for school in schools
+                        if search.lower() in f"{school['displayName']} {school['loginName']}".lower()
+                    ]}})
+
+                calls = body if isinstance(body, list) else [body]
+                answers = []
+                for call in calls:
+                    params = call["params"][0] if call["params"] else {}
+                    if "auth" in params and not server.payloads.check(params["auth"]):
+                        answers.append({"id": call["id"], "jsonrpc": "2.0",
+                                        "error": {"code": -8521, "message": "authentication error"}})
+                        continue
+                    try:
+                        answers.append({"id": call["id"], "jsonrpc": "2.0",
+                                        "result": server.payloads.call(call["method"], params)})
+                    except KeyError:
+                        answers.append({"id": call["id"], "jsonrpc": "2.0",
+                                        "error": {"code": -8998, "message": "unknown method"}})
+
+                self._answer(answers if isinstance(body, list) else answers[0])
+
+            def do_GET(self):
+                server.requests += 1
+                server.latency and time.sleep(server.latency)
+                # rest view answers never change, clients revalidate with the etag
+                etag = f'"{hash(self.path) & 0xFFFFFFFF:x}"'
+                if self.headers.get("if-none-match") == etag:
+                    self.send_response(304)
+                    self.send_header("etag", etag)
+                    self.end_headers()
+                    return
+
+                self._answer({"path": urllib.parse.urlparse(self.path).path, "data": {}}, etag)
+
+        self._httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.host = f"127.0.0.1:{self._httpd.server_port}"
+        self.search_url = f"http://{self.host}/schoolquery2"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+
+    def __enter__(self) -> "FakeServer":
+        self._thread.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._httpd.shutdown()
+        self._httpd.server_close()
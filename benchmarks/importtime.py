@@ -0,0 +1,84 @@
+"""
+Import time budget of the package.
+Imports every module without optional dependencies in a fresh interpreter, fails if it takes longer than the budget
+or if a heavy dependency gets imported without being used.
+
+usage (from repository root):
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --budget 30 --repeat 10
+"""
+
+import argparse
+import importlib.util
+import json
+import pkgutil
+import statistics
+import subprocess
+import sys
+
+
+# modules which need an optional dependency at import, see extras in pyproject.toml
+optional = {"pyWebUntis.asyncnetwork", "pyWebUntis.asyncstorage", "pyWebUntis.frames"}
+
+# modules of the package and dependencies which must not be imported by them
+modules = sorted(
+    module.name
+    for module in pkgutil.iter_modules(importlib.util.find_spec("pyWebUntis").submodule_search_locations, "pyWebUntis.")
+    if module.name not in optional
+)
+deferred = ["pendulum", "requests", "urllib3", "asyncio", "aiohttp", "numpy", "orjson", "msgspec"]
+
+script = """
+import sys, time
+start = time.perf_counter()
+{imports}
+duration = time.perf_counter() - start
+print(json.dumps({{"ms": duration * 1000, "loaded": [name for name in {deferred!r} if name in sys.modules]}}))
+"""
+
+
+
+
+def measure(repeat: int) -> dict:
+    """
+    imports modules repeat times, every time in a new interpreter
+    :return: dict {min, median, loaded}
+    """
+
+    # json gets imported before the clock starts, the package uses it too
+    code = "import json\n" + script.format(imports="\n".join(f"import {name}" for name in modules), deferred=deferred)
+
+    times, loaded = [], set()
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        result = json.loads(output)
+        times.append(result["ms"])
+        loaded.update(result["loaded"])
+
+    return {"min": min(times), "median": statistics.median(times), "loaded": sorted(loaded)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=50, help="max milliseconds of import")
+    parser.add_argument("--repeat", type=int, default=5, help="interpreters started")
+    args = parser.parse_args()
+
+    result = measure(args.repeat)
+    print(f"import {', '.join(modules)}: min {result['min']:.2f} ms, median {result['median']:.2f} ms,"
+          f" budget {args.budget:.0f} ms")
+
+    failed = False
+    if result["min"] > args.budget:
+        print(f"over budget by {result['min'] - args.budget:.2f} ms")
+        failed = True
+
+    if result["loaded"]:
+        print(f"imported at import time: {', '.join(result['loaded'])}")
+        failed = True
+
+    sys.exit(failed)
+
+
+if __name__ == "__main__":
+    main()
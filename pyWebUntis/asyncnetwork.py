@@ -0,0 +1,233 @@
+import asyncio
+import time
+
+import aiohttp
+import pyWebUntis.error
+import pyWebUntis.metrics
+import pyWebUntis.search
+from pyWebUntis import network
+
+
+
+
+# one connection pool per event loop, shared by all AsyncAPI instances
+_sessions: dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+
+def get_session(limit: int = 100, limit_per_host: int = 10) -> aiohttp.ClientSession:
+    """
+    Gets the shared aiohttp session of the running event loop, creates it if needed
+    :param limit: max open connections of the pool, only used on creation
+    :param limit_per_host: max open connections per untis server, only used on creation
+    :return: aiohttp.ClientSession
+    """
+
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host)
+        session = aiohttp.ClientSession(connector=connector, headers=network.API.headers)
+        _sessions[loop] = session
+
+    return session
+
+
+async def close():
+    """
+    Closes the shared session of the running event loop
+    """
+
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    session and await session.close()
+
+
+
+
+class AsyncAPI(network.API):
+    """
+    asyncio version of network.API
+    All api functions (getTimetable, getUserData, getExams, ...) return awaitables.
+    """
+
+    session: aiohttp.ClientSession = None
+
+    # errors of aiohttp which are retried by transport
+    transient = (aiohttp.ClientError,)
+
+
+    def __init__(self: object, server: str , loginName:str, username:str="#anonymous#", password:str="",
+                 session: aiohttp.ClientSession = None, **kwargs):
+        """
+        Init function for AsyncAPI class.
+        Timeouts and retries are taken from transport, the connection pool from session.
+        :param server: base server url
+        :param loginName: identifier name from school
+        :param username: username of used default "#anonymous#"
+        :param password: password of user default ""
+        :param session: aiohttp session, default shared session of running event loop
+        :param kwargs: passed to network.API, e.g. transport
+        """
+
+        super().__init__(server=server, loginName=loginName, username=username, password=password, **kwargs)
+        self.session = session
+
+
+    def _session(self) -> aiohttp.ClientSession:
+        """
+        helper function returns given session or the shared pool
+        :return: aiohttp.ClientSession
+        """
+
+        return self.session or get_session()
+
+
+    async def _send(self, method: str, url: str, json=None, **kwargs) -> tuple[int, dict, bytes]:
+        """
+        Sends one request with timeouts and codec of transport
+        :param method: GET | POST
+        :param url: url
+        :param json: body, encoded with codec of transport
+        :param kwargs: arguments for aiohttp.ClientSession.request
+        :return: status, headers, content
+        :raise aiohttp.ClientResponseError for status codes which can be retried
+        """
+
+        connect, read = self.transport.timeout
+        timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+        span = pyWebUntis.metrics.current()
+
+        if json is not None:
+            kwargs["data"] = self.transport.codec.dumps(json)
+            span.set("request_bytes", len(kwargs["data"]))
+
+        async with self._session().request(method, url, timeout=timeout, **kwargs) as response:
+            if response.status in self.transport.retry_status:
+                response.raise_for_status()
+
+            content = await response.read()
+
+        span.set("status", response.status)
+        span.set("response_bytes", len(content))
+
+        return response.status, response.headers, content
+
+
+    def _decode(self, content: bytes):
+        span = pyWebUntis.metrics.current()
+
+        start = time.perf_counter()
+        result = self.transport.codec.loads(content)
+        span.set("decode_ms", (time.perf_counter() - start) * 1000)
+
+        return result
+
+
+    async def _fetch(self, method: str, url: str, json=None, **kwargs) -> dict:
+        """
+        Sends one request, see _send
+        :return: decoded json
+        """
+
+        _, _, content = await self._send(method, url, json, **kwargs)
+        return self._decode(content)
+
+
+    # helper functions
+    async def get_school_data(self):
+        """
+        Search school with the given string.
+        :return: school with loginName
+        :raise UntisError InvalidSchool when no school has loginName
+        """
+        baseurl = pyWebUntis.search.SchoolSearch.url
+        json = self._school_search_request()
+
+        data = await self.transport.aretry(self._fetch, "POST", baseurl, json=json, transient=self.transient)
+        return self._select_school(data["result"]["schools"])
+
+
+    ## API functions
+    # default requests function
+    async def _requests(self, method: str, params: dict = None, auth:bool=True) -> dict:
+        """
+        Creates default requests for untis server
+        :param method: method which get used
+        :param params: params for request
+        :param auth: default True only false for login
+        :return: dict
+        :raise UntisError when requests return error
+        """
+
+        with pyWebUntis.metrics.registry.span("untis.request", method=method, server=self.server):
+            if method in self.unsafe_methods:
+                return await self.transport.alimited(self._request_once, method, params, auth)
+
+            return await self.transport.aretry(self._request_once, method, params, auth, transient=self.transient)
+
+
+    async def _request_once(self, method: str, params: dict = None, auth:bool=True) -> dict:
+        """
+        Sends one request to untis server, see _requests
+        :raise UntisError when requests return error
+        """
+
+        start = time.time()
+        auth and await self.credentials.asecret(self)
+        url, url_params, data = self._build_request(method, params, auth)
+
+        result = await self._fetch("POST", url, params=url_params, json=data)
+        try:
+            return self._parse_result(result)
+        except pyWebUntis.error.UntisError as error:
+            # shared secret is outdated, sent once more with a new one
+            if not (auth and self.credentials.invalidate(self, error, start)):
+                raise
+
+        await self.credentials.asecret(self)
+        url, url_params, data = self._build_request(method, params, auth)
+        return self._parse_result(await self._fetch("POST", url, params=url_params, json=data))
+
+
+    async def getColors(self) -> dict:
+        """
+        get colors of school
+        :return: dict {key : {foreColor, backColor}}
+        """
+        result = await self._requests(method="getColors2017")
+        return self._parse_colors(result)
+
+
+    def batch(self):
+        """
+        json rpc batches are not supported by AsyncAPI, Batch sends blocking single requests as fallback.
+        Concurrent calls with asyncio.gather share the connection pool instead.
+        :raise NotImplementedError
+        """
+
+        raise NotImplementedError("AsyncAPI has no batches, use asyncio.gather")
+
+
+    # some special api functions?
+    async def _get_request(self, path):
+        """"""
+        url, headers = self._build_get_request(path)
+
+        entry = self.rest_cache.lookup(url)
+        if self.rest_cache.fresh(entry, path):
+            return entry[3]
+
+        with pyWebUntis.metrics.registry.span("untis.rest", method=path, server=self.server):
+            status, response, content = await self.transport.aretry(
+                self._send, "GET", url, headers={**headers, **self.rest_cache.conditional(entry)},
+                raise_for_status=True, transient=self.transient)
+
+            if status == 304 and entry is not None:
+                self.rest_cache.store(url, response, None, entry)
+                return entry[3]
+
+            # error answers are raised by aiohttp and never cached
+            data = self._decode(content)
+            status < 300 and self.rest_cache.store(url, response, data)
+            return data
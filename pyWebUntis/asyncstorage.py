@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import itertools
+from typing import TYPE_CHECKING, Union
+
+import pyWebUntis.error
+from pyWebUntis import asyncnetwork, storage
+
+if TYPE_CHECKING:
+    import pendulum
+
+
+
+
+class AsyncSchool(storage.School):
+    """
+    asyncio version of storage.School
+    Create it with `await AsyncSchool.create(...)` or call `await school.load()` before usage.
+    """
+
+    api: asyncnetwork.AsyncAPI
+
+
+    def __init__(self: object, server: str, loginName: str, username: str = "#anonymous#", password: str = "",
+                 session=None, cache=None, transport=None, **kwargs):
+        """
+        Init function for AsyncSchool class. Does not load any data, see load()
+        :param server: base server url
+        :param loginName: identifier name from school
+        :param username: username of used default "#anonymous#"
+        :param password: password of user default ""
+        :param session: aiohttp session, default shared session of running event loop
+        :param cache: default None, MasterDataCache to start from, gets revalidated when expired
+        :param transport: default shared Transport of server, timeouts and retries
+        :param kwargs: will get ignored
+        """
+
+        self.api = asyncnetwork.AsyncAPI(server=server, loginName=loginName, username=username, password=password,
+                                         session=session, transport=transport)
+        self.cache = cache
+
+
+    @classmethod
+    async def create(cls, server: str, loginName: str, username: str = "#anonymous#", password: str = "", **kwargs):
+        """
+        Creates and loads school
+        :return: AsyncSchool
+        """
+
+        school = cls(server=server, loginName=loginName, username=username, password=password, **kwargs)
+        await school.load()
+        return school
+
+
+    async def load(self):
+        """
+        loads school data and master data
+        """
+
+        if self._load_cache():
+            self.cache.expired(self.fetched) and await self.revalidate()
+            return
+
+        self._set_school_data(await self.api.get_school_data())
+        self._set_user_data(await self.api.getUserData())
+        self._store_cache()
+
+
+    async def revalidate(self):
+        """
+        checks with one small timetable request if master data changed since it was loaded
+        falls back to getUserData if the user may not read the timetable, keeps the cached data if both fail
+        """
+
+        args = self._revalidate_args()
+        if args is not None:
+            try:
+                self._apply_revalidation(await self.api.getTimetable(**args))
+                return
+            except pyWebUntis.error.UntisError:
+                pass
+
+        try:
+            self._set_user_data(await self.api.getUserData())
+        except pyWebUntis.error.UntisError:
+            return
+
+        self._store_cache()
+
+
+    async def get_timetable_week(self, ID:Union[int,str], typ:str, date:pendulum) -> dict:
+        """
+        get timetable from week sorted in days
+        :param ID: ID of class | Student | ...
+        :param typ: Type CLASS | STUDENT | ...
+        :param date: any day in week
+        :return:
+        """
+
+        startDate, endDate = self.api._getMoSofromDate(storage._to_date(date))
+        result = await self.api.getTimetable(startDate=startDate, endDate=endDate, ID=ID, typ=typ)
+        return self._sort_week(result["timetable"])
+
+
+    async def get_timetable_range(self, ID:Union[int,str], typ:str, startDate:pendulum.date, endDate:pendulum.date) -> dict:
+        """
+        get timetable of a date range in as few requests as possible, sorted in weeks and days
+        see School.get_timetable_range
+        :param ID: ID of class | Student | ...
+        :param typ: Type CLASS | STUDENT | ...
+        :param startDate: any day in first week
+        :param endDate: any day in last week
+        :return: dict {"YYYY-MM-DD" of monday: {Mon: [Stunde, ...], ...}}
+        """
+
+        key = (self.api.server, self.api.loginName)
+        span = self.spans.get(key, self.max_span)
+
+        current, _ = self.api._getMoSofromDate(storage._to_date(startDate))
+        _, last = self.api._getMoSofromDate(storage._to_date(endDate))
+
+        periods = []
+        while current <= last:
+            end = min(current.add(weeks=span, days=-1), last)
+
+            try:
+                result = await self.api.getTimetable(startDate=current, endDate=end, ID=ID, typ=typ)
+            except pyWebUntis.error.UntisError as error:
+                if error.name != "TooManyResults" or span == 1:
+                    raise
+
+                span = span // 2
+                continue
+
+            self.spans[key] = span
+            periods.extend(result["timetable"]["periods"])
+            current = end.add(days=1)
+
+        first, _ = self.api._getMoSofromDate(storage._to_date(startDate))
+        return self._split_weeks(periods, first, last)
+
+
+    async def _fetch_weeks(self, ID:str, typ:str, workers:int=1):
+        """
+        fetches the weeks from today until end of current school year
+        with up to `workers` requests in flight, results are yielded in date order
+        :param ID: id
+        :param typ: type
+        :param workers: default 1, count of concurrent requests
+        :return: async generator of getTimetable2017 answers
+        """
+
+        import pendulum
+
+        year = self.get_current_school_year()
+        endDate = pendulum.parse(year["endDate"])
+        weeks = self.api.date_iter(end= endDate)
+
+        # sliding window of tasks, the oldest week is always consumed first
+        pending = collections.deque()
+        try:
+            for start, end in itertools.islice(weeks, max(workers, 1)):
+                pending.append(asyncio.ensure_future(self.api.getTimetable(start, end, ID=ID, typ=typ)))
+
+            while pending:
+                result = await pending.popleft()
+
+                for start, end in itertools.islice(weeks, 1):
+                    pending.append(asyncio.ensure_future(self.api.getTimetable(start, end, ID=ID, typ=typ)))
+
+                yield result
+
+        finally:
+            # consumer stopped early, drop weeks which are not needed anymore
+            for task in pending:
+                task.cancel()
+
+
+    async def find_next_school_week(self, ID:str, typ:str, iter:bool=False, workers:int=1):
+        """
+        finds next school week and yields raw dict with timetable data
+        :param ID: id
+        :param typ: type
+        :param iter: default False, if shoud iter until last date of year
+        :param workers: default 1, count of weeks which get fetched concurrently
+        :return: async generator of dicts
+        """
+
+        weeks = self._fetch_weeks(ID, typ, workers=workers)
+        try:
+            async for result in weeks:
+
+                if result["timetable"]["periods"]:
+                    yield self._resolve_periods(result)
+
+                    if not iter:
+                        return
+
+        finally:
+            await weeks.aclose()
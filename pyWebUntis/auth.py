@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import pathlib
+import struct
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import pyWebUntis.error
+import pyWebUntis.metrics
+from pyWebUntis import utils
+
+if TYPE_CHECKING:
+    from pyWebUntis import network
+
+
+
+
+def otp(secret: str, clientTime: int, digits: int = 6, step: int = 30) -> int:
+    """
+    Calculates the one time password of the untis apps, TOTP (RFC 6238) with HMAC-SHA1
+    :param secret: base32 shared secret of getAppSharedSecret
+    :param clientTime: milliseconds since epoch, same as clientTime of auth
+    :param digits: default 6
+    :param step: default 30, seconds one password is valid
+    :return: int
+    """
+
+    secret = secret.replace(" ", "").upper()
+    key = base64.b32decode(secret + "=" * (-len(secret) % 8))
+
+    digest = hmac.new(key, struct.pack(">Q", clientTime // 1000 // step), hashlib.sha1).digest()
+    offset = digest[-1] & 0x0F
+    code = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+
+    return code % 10 ** digits
+
+
+
+
+class AuthManager:
+    """
+    Shared secrets of users per (server, loginName, username).
+    The secret is fetched once with getAppSharedSecret and every auth block gets a locally calculated
+    otp. It is fetched again after `max_age` or when the server answers RequiredAuthentication or
+    AuthenticationError. Secrets are kept in memory, with `path` also in a file only readable by the
+    owner. Passwords are never stored.
+    """
+
+    anonymous = "#anonymous#"
+    # RequiredAuthentication, AuthenticationError
+    refresh_codes = {"-8520", "-8521"}
+
+    max_age: float
+    path: pathlib.Path
+
+
+    def __init__(self, max_age: float = 24 * 3600, path: str = None):
+        """
+        Init function for AuthManager class.
+        :param max_age: default 1 day, seconds until a secret gets fetched again
+        :param path: default None, json file secrets are persisted in, e.g. for short lived processes
+        """
+
+        self.max_age = max_age
+        self.path = pathlib.Path(path) if path else None
+
+        # key: (secret, fetched)
+        self._secrets: dict[tuple[str, str, str], tuple[str, float]] = {}
+        self._fetching = utils.SingleFlight()
+        self._afetching = utils.AsyncSingleFlight()
+        self._lock = threading.Lock()
+
+        self.path and self._read()
+
+
+    @staticmethod
+    def key(api: network.API) -> tuple[str, str, str]:
+        return api.server, api.loginName, api.username
+
+
+    def is_anonymous(self, api: network.API) -> bool:
+        return not api.username or api.username == self.anonymous
+
+
+    def cached(self, api: network.API) -> str:
+        """
+        :return: cached secret of user or None
+        """
+
+        with self._lock:
+            entry = self._secrets.get(self.key(api))
+
+        if entry is None or time.time() - entry[1] > self.max_age:
+            return None
+
+        return entry[0]
+
+
+    def store(self, api: network.API, secret: str):
+        with self._lock:
+            self._secrets[self.key(api)] = (secret, time.time())
+            self.path and self._write()
+
+
+    def secret(self, api: network.API) -> str:
+        """
+        Gets secret of user, fetches it if needed, threads asking at the same time share one request
+        :param api: API of user
+        :return: base32 secret
+        """
+
+        secret = self.cached(api)
+        pyWebUntis.metrics.registry.count("cache", cache="secret", result="miss" if secret is None else "hit")
+        if secret is not None:
+            return secret
+
+        return self._fetching.do(self.key(api), self._fetch, api)
+
+
+    def _fetch(self, api: network.API) -> str:
+        secret = api.getAppSharedSecret(api.username, api.password)
+        self.store(api, secret)
+        return secret
+
+
+    async def asecret(self, api: network.API) -> str:
+        """
+        asyncio version of secret, for AsyncAPI
+        :return: base32 secret, None for anonymous users
+        """
+
+        if self.is_anonymous(api):
+            return None
+
+        secret = self.cached(api)
+        pyWebUntis.metrics.registry.count("cache", cache="secret", result="miss" if secret is None else "hit")
+        if secret is not None:
+            return secret
+
+        return await self._afetching.do(self.key(api), self._afetch, api)
+
+
+    async def _afetch(self, api: network.API) -> str:
+        secret = await api.getAppSharedSecret(api.username, api.password)
+        self.store(api, secret)
+        return secret
+
+
+    def invalidate(self, api: network.API, error: pyWebUntis.error.UntisError, before: float) -> bool:
+        """
+        Drops secret after an auth error
+        :param api: API of user
+        :param error: error of request
+        :param before: time.time() before the request was built, newer secrets are kept
+        :return: True if the request should be sent again with a new secret
+        """
+
+        if error.code not in self.refresh_codes or self.is_anonymous(api):
+            return False
+
+        with self._lock:
+            entry = self._secrets.get(self.key(api))
+            if entry is not None and entry[1] <= before:
+                del self._secrets[self.key(api)]
+                self.path and self._write()
+
+        return True
+
+
+    def auth(self, api: network.API) -> dict:
+        """
+        Creates auth block of a request
+        :param api: API of user, AsyncAPI needs to await asecret first
+        :return: dict
+        """
+
+        clientTime = int(time.time() * 1000)
+
+        if self.is_anonymous(api):
+            return {"clientTime": clientTime, "otp": 0, "user": f"{api.username}"}
+
+        return {"clientTime": clientTime, "otp": otp(self.secret(api), clientTime), "user": f"{api.username}"}
+
+
+    # persistence
+    def _read(self):
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+
+        for key, (secret, fetched) in data.items():
+            self._secrets[tuple(json.loads(key))] = (secret, fetched)
+
+
+    def _write(self):
+        """
+        writes all secrets atomically, needs to be called with lock
+        """
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {json.dumps(key): entry for key, entry in self._secrets.items()}
+
+        temporary = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w") as file:
+            json.dump(data, file)
+
+        os.replace(temporary, self.path)
+
+
+# default manager used by API
+default = AuthManager()
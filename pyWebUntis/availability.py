@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import bisect
+import datetime
+import threading
+from typing import Iterable, Union
+
+import pyWebUntis.export
+from pyWebUntis import dates, storage
+
+
+
+
+def _epoch(value: Union[int, str, datetime.datetime]) -> int:
+    """
+    helper function converts time like untis sends it to seconds since epoch
+    naive datetimes are local time of the school, like the times of untis
+    """
+
+    if isinstance(value, int):
+        return value
+
+    if isinstance(value, datetime.datetime):
+        value = f"{value:%Y-%m-%dT%H:%M:%S}"
+
+    return dates.epoch(value)
+
+
+
+
+class Occupancy:
+    """
+    Occupied time of one element.
+    Periods are kept by id, the merged and sorted blocks get rebuilt on the first query after a change.
+    """
+
+    __slots__ = ("periods", "_starts", "_ends")
+
+    def __init__(self):
+        # period id: (start, end)
+        self.periods: dict[int, tuple[int, int]] = {}
+        self._starts: list[int] = None
+        self._ends: list[int] = None
+
+
+    def set(self, id: int, start: int, end: int):
+        if self.periods.get(id) != (start, end):
+            self.periods[id] = (start, end)
+            self._starts = None
+
+
+    def remove(self, id: int):
+        if self.periods.pop(id, None) is not None:
+            self._starts = None
+
+
+    def blocks(self) -> tuple[list[int], list[int]]:
+        """
+        merged occupied blocks, sorted and without overlaps
+        :return: starts, ends
+        """
+
+        if self._starts is None:
+            starts, ends = [], []
+            for start, end in sorted(self.periods.values()):
+                if ends and start <= ends[-1]:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+
+            self._starts, self._ends = starts, ends
+
+        return self._starts, self._ends
+
+
+    def busy(self, start: int, end: int) -> bool:
+        """
+        :return: True if any block overlaps [start, end)
+        """
+
+        starts, ends = self.blocks()
+        # last block starting before end of query
+        i = bisect.bisect_left(starts, end) - 1
+        return i >= 0 and ends[i] > start
+
+
+    def free(self, start: int, end: int) -> list[tuple[int, int]]:
+        """
+        :return: free (start, end) slots in [start, end)
+        """
+
+        starts, ends = self.blocks()
+        slots = []
+        current = start
+
+        # first block ending after start of query
+        i = bisect.bisect_right(ends, start)
+        while i < len(starts) and starts[i] < end:
+            starts[i] > current and slots.append((current, starts[i]))
+            current = max(current, ends[i])
+            i += 1
+
+        current < end and slots.append((current, end))
+        return slots
+
+
+
+
+class Availability:
+    """
+    Index of occupied time of rooms, teachers and klassen of a school.
+    Fed with fetched timetables, e.g. of every klasse, and updated by adding newer answers:
+    periods are replaced by id, moved periods free the elements they left and cancelled periods free all.
+    Queries bisect the merged blocks of an element, times are untis times (local time of the school).
+    Only time covered by added timetables is known, everything else counts as free.
+    usage:
+        availability = Availability(school)
+        for klasse in school.masterData["klassen"]:
+            availability.add(school.get_timetable_week(klasse["id"], "CLASS", today))
+        availability.free_rooms("2024-03-05T10:00", "2024-03-05T11:30")
+    """
+
+    # element types which occupy time
+    types = ("CLASS", "TEACHER", "ROOM")
+
+    school: storage.School
+
+
+    def __init__(self, school: storage.School):
+        """
+        Init function for Availability class.
+        :param school: School of the timetables, used for masterData
+        """
+
+        self.school = school
+        self._elements: dict[tuple[str, int], Occupancy] = {}
+        # period id: elements it occupies
+        self._periods: dict[int, tuple[tuple[str, int], ...]] = {}
+        self._lock = threading.Lock()
+
+
+    def add(self, results: Iterable, typ: str = None, ID: int = None, start=None, end=None) -> int:
+        """
+        Adds fetched timetables
+        :param results: anything pyWebUntis.export accepts, e.g. get_timetable_week results,
+                        getTimetable2017 answers or find_next_school_week(iter=True)
+        :param typ: default None, with ID: results are the whole timetable of this element from start to end,
+                    its periods in that time which are missing in results get removed
+        :param ID: default None, id of element
+        :param start: default first day of results, see busy
+        :param end: default end of last day of results, see busy
+        :return: count of periods
+        """
+
+        if isinstance(results, dict):
+            results = [results]
+
+        seen = set()
+        first = last = None
+
+        with self._lock:
+            for id, _, begin, finish, state, _, elements in pyWebUntis.export._periods(results):
+                begin, finish = dates.epoch(begin), dates.epoch(finish)
+                cancelled = "CANCELLED" in (state or ())
+
+                self._set(id, begin, finish, () if cancelled else tuple(
+                    element for element in elements if element[0] in self.types))
+
+                seen.add(id)
+                first = begin if first is None else min(first, begin)
+                last = finish if last is None else max(last, finish)
+
+            occupancy = typ is not None and self._elements.get((typ, ID))
+            if occupancy and (start is not None or first is not None):
+                # whole days, a day without periods in results is still covered
+                start = _epoch(start) if start is not None else first - first % 86400
+                end = _epoch(end) if end is not None else last - last % 86400 + 86400
+
+                for id, (begin, finish) in list(occupancy.periods.items()):
+                    start <= begin < end and id not in seen and self._set(id, begin, finish, ())
+
+        return len(seen)
+
+
+    def _set(self, id: int, start: int, end: int, elements: tuple):
+        """
+        helper function moves period to elements, needs to be called with lock
+        :param elements: elements the period occupies now, empty to remove it
+        """
+
+        for element in self._periods.get(id, ()):
+            occupancy = element not in elements and self._elements.get(element)
+            occupancy and occupancy.remove(id)
+
+        for element in elements:
+            occupancy = self._elements.get(element)
+            occupancy is None and (occupancy := self._elements.setdefault(element, Occupancy()))
+            occupancy.set(id, start, end)
+
+        if elements:
+            self._periods[id] = elements
+        else:
+            self._periods.pop(id, None)
+
+
+    def busy(self, typ: str, ID: int, start, end) -> bool:
+        """
+        Checks if element is occupied in time range
+        :param typ: CLASS | TEACHER | ROOM
+        :param ID: id of element
+        :param start: untis time, iso string, naive datetime or epoch seconds
+        :param end: same as start
+        :return: bool
+        """
+
+        occupancy = self._elements.get((typ, ID))
+        return occupancy is not None and occupancy.busy(_epoch(start), _epoch(end))
+
+
+    def free(self, typ: str, start, end) -> list[int]:
+        """
+        Finds elements of masterData which are free in time range
+        :param typ: CLASS | TEACHER | ROOM
+        :param start: see busy
+        :param end: see busy
+        :return: list of ids
+        """
+
+        start, end = _epoch(start), _epoch(end)
+        parameter = pyWebUntis.export.parameters[typ]
+
+        return [entry["id"] for entry in self.school.masterData[parameter]
+                if not self.busy(typ, entry["id"], start, end)]
+
+
+    def free_rooms(self, start, end) -> list[dict]:
+        """
+        Finds rooms which are free in time range, e.g. free_rooms("2024-03-05T10:00", "2024-03-05T11:30")
+        :param start: see busy
+        :param end: see busy
+        :return: list of room dicts of masterData
+        """
+
+        index = self.school._index("rooms", "id")
+        return [index[ID][0] for ID in self.free("ROOM", start, end)]
+
+
+    def free_slots(self, typ: str, ID: int, start, end) -> list[tuple[int, int]]:
+        """
+        Finds free time of one element, e.g. when a teacher is free this week
+        :param typ: CLASS | TEACHER | ROOM
+        :param ID: id of element
+        :param start: see busy
+        :param end: see busy
+        :return: list of (start, end) as epoch seconds in untis time, see pyWebUntis.dates
+        """
+
+        start, end = _epoch(start), _epoch(end)
+        occupancy = self._elements.get((typ, ID))
+        return occupancy.free(start, end) if occupancy is not None else [(start, end)]
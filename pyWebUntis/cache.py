@@ -0,0 +1,230 @@
+import collections
+import json
+import os
+import pathlib
+import threading
+import time
+import urllib.parse
+from typing import Union
+
+import pyWebUntis.metrics
+
+
+
+
+class MasterDataCache:
+    """
+    On disk cache of school data and master data.
+    Entries are stored as <path>/<server>/<loginName>/<username>/<masterDataTimestamp>.json, per user
+    because userData and settings of getUserData2017 belong to the logged in user.
+    """
+
+    path: pathlib.Path
+    max_age: float
+
+
+    def __init__(self, path: str = None, max_age: float = 3600):
+        """
+        Init function for MasterDataCache class.
+        :param path: cache directory, default ~/.cache/pyWebUntis
+        :param max_age: seconds until a cached entry gets revalidated, default 1 hour
+        """
+
+        if path is None:
+            path = pathlib.Path(os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache") / "pyWebUntis"
+
+        self.path = pathlib.Path(path)
+        self.max_age = max_age
+
+
+    def _directory(self, server: str, loginName: str, username: str) -> pathlib.Path:
+        """
+        helper function gets directory of a user of a school
+        :param server: base server url
+        :param loginName: identifier name from school
+        :param username: username of entry, e.g. #anonymous#
+        :return: pathlib.Path
+        """
+
+        return (self.path / urllib.parse.quote(server, safe="") / urllib.parse.quote(loginName, safe="")
+                / urllib.parse.quote(username, safe=""))
+
+
+    def load(self, server: str, loginName: str, username: str) -> Union[dict, None]:
+        """
+        loads newest entry of user of school
+        :param server: base server url
+        :param loginName: identifier name from school
+        :param username: username of entry, e.g. #anonymous#
+        :return: dict {timestamp, fetched, schoolData, userData} or None
+        """
+
+        entry = self._load(server, loginName, username)
+        pyWebUntis.metrics.registry.count("cache", cache="masterdata", result="miss" if entry is None else "hit")
+        return entry
+
+
+    def _load(self, server: str, loginName: str, username: str) -> Union[dict, None]:
+        directory = self._directory(server, loginName, username)
+        if not directory.is_dir():
+            return None
+
+        files = sorted(directory.glob("*.json"), key=lambda file: int(file.stem))
+        for file in reversed(files):
+            try:
+                return json.loads(file.read_text(encoding="UTF8"))
+            except (OSError, ValueError):
+                continue
+
+        return None
+
+
+    def store(self, server: str, loginName: str, username: str, schoolData: dict, userData: dict):
+        """
+        stores entry of user of school and removes older entries
+        :param server: base server url
+        :param loginName: identifier name from school
+        :param username: username of entry, e.g. #anonymous#
+        :param schoolData: dict of school from searchSchool
+        :param userData: result of getUserData2017
+        """
+
+        timestamp = int(userData["masterData"].get("timeStamp", 0))
+        entry = {
+            "timestamp": timestamp,
+            "fetched": time.time(),
+            "schoolData": schoolData,
+            "userData": userData,
+        }
+
+        directory = self._directory(server, loginName, username)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        # write to temp file first, so a crashing worker never leaves a broken entry
+        file = directory / f"{timestamp}.json"
+        temp = directory / f"{timestamp}.json.{os.getpid()}.tmp"
+        temp.write_text(json.dumps(entry), encoding="UTF8")
+        os.replace(temp, file)
+
+        for old in directory.glob("*.json"):
+            old != file and old.unlink(missing_ok=True)
+
+
+    def expired(self, fetched: float) -> bool:
+        """
+        checks if entry should be revalidated
+        :param fetched: "fetched" time of entry from load()
+        :return: bool
+        """
+
+        return time.time() - fetched > self.max_age
+
+
+
+
+class RestCache:
+    """
+    In memory HTTP cache of the rest view endpoints.
+    An answer is used without request for the ttl of its endpoint, afterwards it gets revalidated with
+    If-None-Match / If-Modified-Since and a 304 answer costs no download.
+    Cached answers are shared between callers and must not be changed.
+    """
+
+    # seconds answers are used without asking the server, per path
+    ttls = {
+        "/WebUntis/api/rest/view/v1/trigger/startup": 3600,
+        "/WebUntis/api/rest/view/v1/mobile/data": 900,
+        "/WebUntis/api/rest/view/v2/home": 60,
+    }
+
+    default_ttl: float
+    size: int
+
+
+    def __init__(self, default_ttl: float = 60, size: int = 256, ttls: dict = None):
+        """
+        Init function for RestCache class.
+        :param default_ttl: default 1 minute, ttl of paths not in ttls
+        :param size: default 256, max count of cached urls
+        :param ttls: default RestCache.ttls, {path: seconds}, 0 always revalidates
+        """
+
+        self.default_ttl = default_ttl
+        self.size = size
+        self.ttls = {**self.ttls, **(ttls or {})}
+
+        # url: [stored, etag, last modified, data]
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def lookup(self, url: str) -> Union[list, None]:
+        """
+        :param url: url with query
+        :return: entry [stored, etag, last modified, data] or None
+        """
+
+        with self._lock:
+            entry = self._entries.get(url)
+            entry is not None and self._entries.move_to_end(url)
+
+        return entry
+
+
+    def fresh(self, entry: list, path: str) -> bool:
+        """
+        checks if entry can be used without request
+        :param entry: entry of lookup
+        :param path: path of endpoint
+        :return: bool
+        """
+
+        fresh = entry is not None and time.monotonic() - entry[0] < self.ttls.get(path, self.default_ttl)
+        pyWebUntis.metrics.registry.count("cache", cache="rest", result="hit" if fresh else "miss")
+        return fresh
+
+
+    @staticmethod
+    def conditional(entry: list) -> dict:
+        """
+        :param entry: entry of lookup or None
+        :return: headers for revalidating entry
+        """
+
+        headers = {}
+        if entry is not None:
+            entry[1] and headers.update({"if-none-match": entry[1]})
+            entry[2] and headers.update({"if-modified-since": entry[2]})
+
+        return headers
+
+
+    def store(self, url: str, headers, data, entry: list = None):
+        """
+        stores answer, or refreshes entry after 304
+        :param url: url with query
+        :param headers: headers of answer
+        :param data: decoded answer, None for 304
+        :param entry: revalidated entry on 304
+        """
+
+        etag = headers.get("etag")
+        modified = headers.get("last-modified")
+
+        if entry is not None and data is None:
+            pyWebUntis.metrics.registry.count("cache", cache="rest", result="revalidated")
+            data = entry[3]
+            etag, modified = etag or entry[1], modified or entry[2]
+
+        # answers without validators can only be reused while fresh
+        with self._lock:
+            self._entries[url] = [time.monotonic(), etag, modified, data]
+            self._entries.move_to_end(url)
+
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,95 @@
+import importlib.util
+import json
+
+# orjson and msgspec are imported on first use, see fastest
+
+
+
+
+class Codec:
+    """
+    Encodes and decodes the json bodies of requests, default is the json module.
+    Decoding errors are raised as ValueError by every codec.
+    """
+
+    name = "json"
+
+
+    def loads(self, data: bytes):
+        return json.loads(data)
+
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), default=str).encode()
+
+
+
+
+class OrjsonCodec(Codec):
+    name = "orjson"
+
+
+    def loads(self, data: bytes):
+        import orjson
+        return orjson.loads(data)
+
+
+    def dumps(self, obj) -> bytes:
+        import orjson
+        return orjson.dumps(obj, default=str)
+
+
+
+
+class MsgspecCodec(Codec):
+    name = "msgspec"
+
+    _decoder = None
+    _encoder = None
+
+
+    def _create(self):
+        """
+        helper function creates decoder and encoder on first use
+        """
+
+        import msgspec
+
+        self._decoder = msgspec.json.Decoder()
+        self._encoder = msgspec.json.Encoder(enc_hook=str)
+
+
+    def loads(self, data: bytes):
+        import msgspec
+
+        self._decoder is None and self._create()
+        try:
+            return self._decoder.decode(data)
+        except msgspec.DecodeError as error:
+            raise ValueError(error) from error
+
+
+    def dumps(self, obj) -> bytes:
+        self._encoder is None and self._create()
+        return self._encoder.encode(obj)
+
+
+
+def fastest() -> Codec:
+    """
+    Gets fastest installed codec: orjson, msgspec or json
+    only looks the modules up, they get imported by the codec on first use
+    :return: Codec
+    """
+
+    if importlib.util.find_spec("orjson") is not None:
+        return OrjsonCodec()
+
+    if importlib.util.find_spec("msgspec") is not None:
+        return MsgspecCodec()
+
+    return Codec()
+
+
+# codec used by Transport if none is given
+default = fastest()
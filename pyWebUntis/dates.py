@@ -0,0 +1,72 @@
+import datetime
+import functools
+
+
+
+
+# keys of a week sorted in days, index is date.weekday()
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+_utc = datetime.timezone.utc
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(text: str) -> datetime.date:
+    """
+    Parses the date of untis date or datetime strings, e.g. 2024-03-04 or 2024-03-04T07:45Z
+    :param text: iso string
+    :return: datetime.date
+    """
+
+    return datetime.date(int(text[0:4]), int(text[5:7]), int(text[8:10]))
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_datetime(text: str) -> datetime.datetime:
+    """
+    Parses untis datetime strings, e.g. 2024-03-04T07:45Z
+    untis sends the local time of the school marked as UTC, times without zone are handled the same
+    :param text: iso string
+    :return: datetime.datetime in UTC
+    """
+
+    value = datetime.datetime.fromisoformat(text)
+    return value if value.tzinfo else value.replace(tzinfo=_utc)
+
+
+def epoch(text: str) -> int:
+    """
+    :param text: untis datetime string
+    :return: seconds since epoch
+    """
+
+    return int(parse_datetime(text).timestamp())
+
+
+def ordinal(text: str) -> int:
+    """
+    :param text: untis date or datetime string
+    :return: proleptic gregorian ordinal of day, see datetime.date.toordinal
+    """
+
+    return parse_date(text[:10]).toordinal()
+
+
+def weekday(text: str) -> int:
+    """
+    :param text: untis date or datetime string
+    :return: 0 monday ... 6 sunday
+    """
+
+    return parse_date(text[:10]).weekday()
+
+
+@functools.lru_cache(maxsize=4096)
+def monday(text: str) -> str:
+    """
+    :param text: untis date or datetime string
+    :return: monday of week as YYYY-MM-DD
+    """
+
+    day = parse_date(text[:10])
+    return f"{day - datetime.timedelta(days=day.weekday()):%Y-%m-%d}"
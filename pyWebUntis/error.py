@@ -33,6 +33,25 @@ class UntisError(Exception):
         if code in self.table:
             error = self.table[code]
 
+        self.code = code
+        self.name = error[0]
 
 
-        super().__init__(*error, message, *args)
\ No newline at end of file
+
+        super().__init__(*error, message, *args)
+
+
+
+class ServerUnavailable(UntisError):
+    """
+    Raised without sending a request while the circuit breaker of a server is open,
+    see pyWebUntis.limiter.Limiter
+    """
+
+    def __init__(self, server: str, retry_after: float) -> None:
+        self.code = "ServerUnavailable"
+        self.name = "ServerUnavailable"
+        self.server = server
+        self.retry_after = retry_after
+
+        Exception.__init__(self, f"server {server} is unavailable, retry in {retry_after:.1f} seconds")
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import datetime
+import io
+import itertools
+from typing import Iterable, Union
+
+from pyWebUntis import dates, storage
+
+
+
+
+# masterData list of every element type, taken from Stunde
+parameters = {descriptor.typ: descriptor.parameter
+              for descriptor in (storage.Stunde.klasse, storage.Stunde.teacher, storage.Stunde.subject,
+                                 storage.Stunde.room)}
+
+# one row per period and exported element
+columns = ("element_type", "element_id", "id", "lesson_id", "day", "start", "end", "state",
+           "klassen", "teachers", "subjects", "rooms", "lesson_text", "substitution_text", "info_text")
+
+# columns of row holding names of elements
+_names = (("CLASS", "klassen"), ("TEACHER", "teachers"), ("SUBJECT", "subjects"), ("ROOM", "rooms"))
+
+
+
+
+def _flatten(result):
+    """
+    helper function yields the periods of a getTimetable2017 answer, a get_timetable_week or
+    get_timetable_range result, a list or a single period
+    """
+
+    if isinstance(result, storage.Stunde) or isinstance(result, dict) and "startDateTime" in result:
+        yield result
+    elif isinstance(result, dict) and "timetable" in result:
+        yield from result["timetable"]["periods"]
+    elif isinstance(result, dict):
+        for value in result.values():
+            yield from _flatten(value)
+    else:
+        for value in result:
+            yield from _flatten(value)
+
+
+def _periods(results: Iterable):
+    """
+    helper function flattens results to periods
+    :return: generator of (id, lessonId, startDateTime, endDateTime, is, text, ((type, id), ...))
+    """
+
+    for period in (period for result in results for period in _flatten(result)):
+        if isinstance(period, storage.Stunde):
+            yield (period.id, getattr(period, "lessonId", None), period.startDateTime, period.endDateTime,
+                   getattr(period, "ist", ()), getattr(period, "text", None),
+                   tuple((typ, ID) for typ, ID, _ in period.elements))
+        else:
+            yield (period["id"], period.get("lessonId"), period["startDateTime"], period["endDateTime"],
+                   period.get("is"), period.get("text"),
+                   tuple((element["type"], element["id"]) for element in period["elements"]))
+
+
+def _resolve(school: storage.School, periods: list[tuple]) -> dict:
+    """
+    helper function looks up every element of a batch once
+    :return: dict {(type, id): name}
+    """
+
+    wanted = {element for period in periods for element in period[6]}
+
+    names = {}
+    for typ, ID in wanted:
+        parameter = parameters.get(typ)
+        entries = parameter and school._index(parameter, "id").get(ID)
+        names[(typ, ID)] = entries[0].get("name", f"{ID}") if entries else f"{ID}"
+
+    return names
+
+
+def _row(period: tuple, typ: str, ID: str, names: dict) -> tuple:
+    id, lesson, start, end, state, text, elements = period
+
+    resolved = {kind: [] for kind, _ in _names}
+    for element in elements:
+        element[0] in resolved and resolved[element[0]].append(names[element])
+
+    text = text or {}
+
+    return (
+        typ, ID, id, lesson, start[:10], dates.epoch(start), dates.epoch(end), ",".join(state or ()),
+        *(",".join(resolved[kind]) for kind, _ in _names),
+        text.get("lesson", ""), text.get("substitution", ""), text.get("info", ""),
+    )
+
+
+def batches(school: storage.School, ID: Union[int, str], typ: str, results: Iterable[dict], size: int = 1000):
+    """
+    Converts periods to rows, only `size` periods are held at a time
+    :param school: School used for resolving elements
+    :param ID: ID of exported element
+    :param typ: type of exported element, CLASS | TEACHER | ...
+    :param results: getTimetable2017 answers, e.g. find_next_school_week(iter=True), results of
+                    get_timetable_week | get_timetable_range, raw periods or Stunde
+    :param size: default 1000, periods per batch
+    :return: generator of list of rows, see columns
+    """
+
+    periods = _periods(results)
+    ID = f"{ID}"
+
+    while batch := list(itertools.islice(periods, size)):
+        names = _resolve(school, batch)
+        yield [_row(period, typ, ID, names) for period in batch]
+
+
+def export(school: storage.School, ID: Union[int, str], typ: str, results: Iterable[dict], exporter: "Exporter",
+           size: int = 1000) -> int:
+    """
+    Streams periods into exporter
+    :param school: School used for resolving elements
+    :param ID: ID of exported element
+    :param typ: type of exported element
+    :param results: see batches
+    :param exporter: SqliteExporter | ParquetExporter | ICalExporter
+    :param size: default 1000, periods per batch
+    :return: count of written rows
+    """
+
+    count = 0
+    for rows in batches(school, ID, typ, results, size):
+        exporter.write(rows)
+        count += len(rows)
+
+    return count
+
+
+
+
+class Exporter:
+    """
+    Target of export, gets rows in batches, see columns
+    """
+
+    def write(self, rows: list[tuple]):
+        raise NotImplementedError
+
+
+    def close(self):
+        pass
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+
+
+class SqliteExporter(Exporter):
+    """
+    Stores rows in a sqlite table, periods of an element get replaced on export again.
+    Indexed by element and day.
+    """
+
+    def __init__(self, path: str, table: str = "periods"):
+        """
+        Init function for SqliteExporter class.
+        :param path: database file, ":memory:" for tests
+        :param table: default periods
+        """
+
+        import sqlite3
+
+        self.table = table
+        self.connection = sqlite3.connect(path)
+
+        self.connection.executescript(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                element_type TEXT, element_id TEXT, id INTEGER, lesson_id INTEGER, day TEXT,
+                start INTEGER, end INTEGER, state TEXT, klassen TEXT, teachers TEXT, subjects TEXT, rooms TEXT,
+                lesson_text TEXT, substitution_text TEXT, info_text TEXT,
+                PRIMARY KEY (element_type, element_id, id)
+            );
+            CREATE INDEX IF NOT EXISTS {table}_element_day ON {table} (element_type, element_id, day);
+            CREATE INDEX IF NOT EXISTS {table}_day ON {table} (day);
+        """)
+        self._insert = f"INSERT OR REPLACE INTO {table} VALUES ({', '.join('?' * len(columns))})"
+
+
+    def write(self, rows: list[tuple]):
+        with self.connection:
+            self.connection.executemany(self._insert, rows)
+
+
+    def close(self):
+        self.connection.close()
+
+
+
+
+class ParquetExporter(Exporter):
+    """
+    Writes rows to a parquet file, one row group per batch. Needs pyarrow.
+    """
+
+    def __init__(self, path: str):
+        """
+        Init function for ParquetExporter class.
+        :param path: parquet file
+        """
+
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as error:
+            raise ImportError("ParquetExporter needs pyarrow, pip install pyarrow") from error
+
+        self.pyarrow = pyarrow
+        string, integer = pyarrow.string(), pyarrow.int64()
+        self.schema = pyarrow.schema([(name, integer if name in ("id", "lesson_id", "start", "end") else string)
+                                      for name in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+
+    def write(self, rows: list[tuple]):
+        data = {name: list(values) for name, values in zip(columns, zip(*rows))}
+        self.writer.write_table(self.pyarrow.Table.from_pydict(data, schema=self.schema))
+
+
+    def close(self):
+        self.writer.close()
+
+
+
+
+class ICalExporter(Exporter):
+    """
+    Writes rows as iCalendar VEVENTs, cancelled periods get STATUS:CANCELLED.
+    Times are written as floating local time like untis sends them.
+    """
+
+    def __init__(self, file: Union[str, io.TextIOBase], name: str = "WebUntis"):
+        """
+        Init function for ICalExporter class.
+        :param file: path or text file
+        :param name: default WebUntis, name of calendar
+        """
+
+        self._own = isinstance(file, str)
+        self.file = open(file, "w", newline="") if self._own else file
+        self.stamp = f"{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%SZ}"
+
+        self._lines("BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//pyWebUntis//export//EN",
+                    f"X-WR-CALNAME:{self._escape(name)}")
+
+
+    @staticmethod
+    def _escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+    @staticmethod
+    def _time(epoch: int) -> str:
+        return f"{datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc):%Y%m%dT%H%M%S}"
+
+
+    @staticmethod
+    def _fold(line: str) -> str:
+        """
+        helper function folds line after 75 octets of UTF-8, continuation lines start with a space
+        characters are never split
+        """
+
+        parts, part, size, limit = [], [], 0, 75
+        for character in line:
+            length = len(character.encode())
+            if size + length > limit:
+                parts.append("".join(part))
+                part, size, limit = [], 0, 74
+            part.append(character)
+            size += length
+
+        parts.append("".join(part))
+        return "\r\n ".join(parts)
+
+
+    def _lines(self, *lines: str):
+        for line in lines:
+            self.file.write(self._fold(line) + "\r\n")
+
+
+    def write(self, rows: list[tuple]):
+        for (typ, ID, id, _, _, start, end, state, klassen, teachers, subjects, rooms,
+             lesson, substitution, info) in rows:
+
+            description = "\\n".join(self._escape(text) for text in (teachers, klassen, lesson, substitution, info)
+                                     if text)
+            self._lines(
+                "BEGIN:VEVENT",
+                f"UID:{id}-{typ}-{ID}@pyWebUntis",
+                f"DTSTAMP:{self.stamp}",
+                f"DTSTART:{self._time(start)}",
+                f"DTEND:{self._time(end)}",
+                f"SUMMARY:{self._escape(subjects or lesson or 'Unterricht')}",
+                *([f"LOCATION:{self._escape(rooms)}"] if rooms else []),
+                *([f"DESCRIPTION:{description}"] if description else []),
+                *(["STATUS:CANCELLED"] if "CANCELLED" in state.split(",") else []),
+                "END:VEVENT",
+            )
+
+
+    def close(self):
+        self._lines("END:VCALENDAR")
+        self._own and self.file.close()
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import time
+from typing import TYPE_CHECKING, Union
+
+import pyWebUntis.metrics
+
+if TYPE_CHECKING:
+    import pendulum
+    from pyWebUntis import storage
+
+
+
+
+class Job:
+    """
+    Timetable of one element of one school for `horizon` weeks starting with the current week
+    """
+
+    __slots__ = ("school", "ID", "typ", "horizon", "priority", "results", "started", "finished")
+
+    def __init__(self, school: Union[storage.School, storage.SchoolReference], ID: Union[int, str], typ: str,
+                 horizon: int = 1, priority: int = 0):
+        self.school = school
+        self.ID = ID
+        self.typ = typ
+        self.horizon = horizon
+        self.priority = priority
+
+        self.results: list[Result] = []
+        self.started: float = None
+        self.finished: float = None
+
+
+    @property
+    def done(self) -> bool:
+        return len(self.results) == self.horizon
+
+
+    @property
+    def latency(self) -> float:
+        """
+        seconds from first request until last week arrived, None while running
+        """
+
+        if self.finished is None:
+            return None
+
+        return self.finished - self.started
+
+
+    def __repr__(self) -> str:
+        return f"Job({self.school.loginName!r}, {self.ID!r}, {self.typ!r}, horizon={self.horizon})"
+
+
+
+
+class Result:
+    """
+    One week of a job
+    """
+
+    __slots__ = ("job", "week", "monday", "timetable", "error", "wait", "latency")
+
+    def __init__(self, job: Job, week: int, monday: pendulum.date):
+        self.job = job
+        self.week = week
+        self.monday = monday
+
+        self.timetable: dict = None
+        self.error: BaseException = None
+        # seconds in queue and seconds of request
+        self.wait: float = 0.0
+        self.latency: float = 0.0
+
+
+    def __repr__(self) -> str:
+        state = "error" if self.error is not None else "ok"
+        return f"Result({self.job!r}, week={self.week}, {state}, {self.latency * 1000:.1f} ms)"
+
+
+
+
+class Scheduler:
+    """
+    Fetches timetables of many schools on a shared worker pool.
+    Every job is split into weeks, the current week of all jobs is fetched before the following weeks,
+    jobs with lower priority value go first within a week. No server gets more than `per_server`
+    requests at a time and free workers are handed to the server which got the fewest requests,
+    so one large school can not starve the others. Schools of the same server share one Transport.
+    usage:
+        scheduler = Scheduler(workers=16, per_server=4)
+        for school in schools:
+            scheduler.add(school, school.masterData["klassen"][0]["id"], "CLASS", horizon=4)
+        for result in scheduler.run():
+            ...
+    """
+
+    workers: int
+    per_server: int
+    jobs: list[Job]
+
+
+    def __init__(self, workers: int = 16, per_server: int = 4):
+        """
+        Init function for Scheduler class.
+        :param workers: default 16, count of requests in flight over all servers
+        :param per_server: default 4, max requests in flight per server
+        """
+
+        self.workers = workers
+        self.per_server = per_server
+        self.jobs = []
+
+        self._sequence = itertools.count()
+
+
+    def add(self, school: Union[storage.School, storage.SchoolReference], ID: Union[int, str], typ: str,
+            horizon: int = 1, priority: int = 0) -> Job:
+        """
+        Adds job
+        :param school: School or SchoolReference, references get loaded by the workers
+        :param ID: id of element
+        :param typ: CLASS | TEACHER | ROOM | ...
+        :param horizon: default 1, count of weeks starting with the current week
+        :param priority: default 0, lower values are fetched first within a week
+        :return: Job, filled while run() is consumed
+        """
+
+        job = Job(school, ID, typ, horizon, priority)
+        self.jobs.append(job)
+        return job
+
+
+    def _queues(self) -> dict[str, list]:
+        """
+        helper function splits jobs into weeks
+        :return: dict {server: heap of (week, priority, sequence, Result, queued)}
+        """
+
+        import pendulum
+
+        today = pendulum.today()
+        now = time.perf_counter()
+
+        queues = collections.defaultdict(list)
+        for job in self.jobs:
+            for week in range(job.horizon):
+                monday = today.add(weeks=week).subtract(days=today.weekday()).date()
+                result = Result(job, week, monday)
+                queues[job.school.server].append((week, job.priority, next(self._sequence), result, now))
+
+        for queue in queues.values():
+            heapq.heapify(queue)
+
+        return queues
+
+
+    @staticmethod
+    def _fetch(result: Result) -> Result:
+        """
+        helper function fetches one week, runs in worker
+        """
+
+        job = result.job
+        start = time.perf_counter()
+        job.started = job.started or start
+
+        try:
+            result.timetable = job.school.api.getTimetable(
+                startDate=result.monday, endDate=result.monday.add(days=6), ID=job.ID, typ=job.typ)
+        except Exception as error:
+            result.error = error
+
+        result.latency = time.perf_counter() - start
+        return result
+
+
+    def _next(self, queues: dict[str, list], running: dict[str, int], served: dict[str, int]) -> tuple:
+        """
+        helper function picks next week to fetch
+        best week and priority of all servers with a free slot, ties go to the least served server
+        :return: (server, queue entry) or None
+        """
+
+        best = None
+        for server, queue in queues.items():
+            if not queue or running[server] >= self.per_server:
+                continue
+
+            week, priority, sequence, *_ = queue[0]
+            key = (week, priority, served[server], sequence)
+            if best is None or key < best[0]:
+                best = (key, server)
+
+        if best is None:
+            return None
+
+        server = best[1]
+        return server, heapq.heappop(queues[server])
+
+
+    def run(self):
+        """
+        Fetches all added jobs
+        :return: generator of Result in order of arrival
+        """
+
+        queues = self._queues()
+        running = collections.Counter()
+        served = collections.Counter()
+        futures = {}
+
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while any(queues.values()) or futures:
+                # fill free workers
+                while len(futures) < self.workers:
+                    picked = self._next(queues, running, served)
+                    if picked is None:
+                        break
+
+                    server, (*_, result, queued) = picked
+                    result.wait = time.perf_counter() - queued
+                    running[server] += 1
+                    served[server] += 1
+                    futures[pool.submit(self._fetch, result)] = server
+
+                finished, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    server = futures.pop(future)
+                    running[server] -= 1
+
+                    result = future.result()
+                    job = result.job
+                    job.results.append(result)
+                    job.done and self._finish(job)
+
+                    pyWebUntis.metrics.registry.observe("untis.fleet.latency_ms", result.latency * 1000,
+                                                        server=server)
+                    pyWebUntis.metrics.registry.observe("untis.fleet.wait_ms", result.wait * 1000, server=server)
+
+                    yield result
+
+        finally:
+            # consumer stopped early, drop weeks which are not needed anymore
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+    @staticmethod
+    def _finish(job: Job):
+        job.finished = time.perf_counter()
+        job.results.sort(key=lambda result: result.week)
+
+
+    def report(self) -> list[dict]:
+        """
+        latency of every job
+        :return: list of dict {job, weeks, errors, latency, request_ms, wait_ms} in order of adding
+        """
+
+        report = []
+        for job in self.jobs:
+            report.append({
+                "job": job,
+                "weeks": len(job.results),
+                "errors": sum(result.error is not None for result in job.results),
+                "latency": job.latency,
+                "request_ms": sum(result.latency for result in job.results) * 1000,
+                "wait_ms": sum(result.wait for result in job.results) * 1000,
+            })
+
+        return report
@@ -0,0 +1,181 @@
+from typing import Iterable
+
+import numpy
+
+import pyWebUntis.export
+
+
+
+
+class TimetableFrame:
+    """
+    Column store of periods from one or many getTimetable2017 answers.
+    One row per period, elements are stored flat with `element_period` pointing to their row.
+    Times are minutes since epoch in the local time of the school, as sent by untis.
+    """
+
+    # element types, index is used as code in element_type
+    types = ("CLASS", "TEACHER", "SUBJECT", "ROOM", "STUDENT")
+
+    # period columns
+    start: numpy.ndarray        # int64 minutes
+    end: numpy.ndarray          # int64 minutes
+    id: numpy.ndarray           # int64
+    lessonId: numpy.ndarray     # int64
+    status: numpy.ndarray       # int32 code into statuses, "is" of period
+    statuses: list[str]
+
+    # element columns
+    element_period: numpy.ndarray   # int64 row of period
+    element_type: numpy.ndarray     # int8 code into types
+    element_id: numpy.ndarray       # int64
+    element_orgId: numpy.ndarray    # int64, 0 if element was not changed
+
+
+    def __init__(self, periods: Iterable[dict] = ()):
+        """
+        Init function for TimetableFrame class.
+        :param periods: raw periods of getTimetable2017 or Stunde
+        """
+
+        start, end, ids, lessons, status = [], [], [], [], []
+        statuses = {}
+        element_period, element_type, element_id, element_orgId = [], [], [], []
+        types = {typ: i for i, typ in enumerate(self.types)}
+
+        for row, period in enumerate(periods):
+            isinstance(period, dict) or (period := self._raw(period))
+            start.append(period["startDateTime"].rstrip("Z"))
+            end.append(period["endDateTime"].rstrip("Z"))
+            ids.append(period.get("id", 0))
+            lessons.append(period.get("lessonId", 0))
+
+            state = period.get("is") or ()
+            isinstance(state, dict) and (state := [key for key, value in state.items() if value])
+            state = ",".join(sorted(key.upper() for key in state))
+            status.append(statuses.setdefault(state, len(statuses)))
+
+            for element in period["elements"]:
+                element_period.append(row)
+                element_type.append(types.get(element["type"], -1))
+                element_id.append(element["id"])
+                element_orgId.append(element.get("orgId") or 0)
+
+        self.start = numpy.array(start, dtype="datetime64[m]").astype(numpy.int64)
+        self.end = numpy.array(end, dtype="datetime64[m]").astype(numpy.int64)
+        self.id = numpy.array(ids, dtype=numpy.int64)
+        self.lessonId = numpy.array(lessons, dtype=numpy.int64)
+        self.status = numpy.array(status, dtype=numpy.int32)
+        self.statuses = list(statuses)
+
+        self.element_period = numpy.array(element_period, dtype=numpy.int64)
+        self.element_type = numpy.array(element_type, dtype=numpy.int8)
+        self.element_id = numpy.array(element_id, dtype=numpy.int64)
+        self.element_orgId = numpy.array(element_orgId, dtype=numpy.int64)
+
+
+    @classmethod
+    def from_results(cls, results: Iterable[dict]) -> "TimetableFrame":
+        """
+        creates frame from fetched timetables, e.g. find_next_school_week(iter=True) for a whole school year
+        :param results: getTimetable2017 answers, results of get_timetable_week | get_timetable_range,
+                        raw periods or Stunde, see pyWebUntis.export
+        :return: TimetableFrame
+        """
+
+        return cls(pyWebUntis.export._flatten(results))
+
+
+    @staticmethod
+    def _raw(period) -> dict:
+        """
+        helper function converts Stunde back to the fields of a raw period
+        """
+
+        return {
+            "startDateTime": period.startDateTime,
+            "endDateTime": period.endDateTime,
+            "id": getattr(period, "id", 0),
+            "lessonId": getattr(period, "lessonId", 0),
+            "is": getattr(period, "ist", ()),
+            "elements": [{"type": typ, "id": ID, "orgId": orgId} for typ, ID, orgId in period.elements],
+        }
+
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+
+    # helper columns
+    @property
+    def minutes(self) -> numpy.ndarray:
+        """duration of periods in minutes"""
+        return self.end - self.start
+
+
+    @property
+    def week(self) -> numpy.ndarray:
+        """monday of week of periods as days since epoch"""
+        days = self.start // (24 * 60)
+        # 1970-01-01 was a thursday
+        return days - (days + 3) % 7
+
+
+    def has_status(self, state: str) -> numpy.ndarray:
+        """
+        boolean mask of periods which have state in "is"
+        :param state: e.g. CANCELLED
+        :return: numpy.ndarray of bool
+        """
+
+        codes = [code for code, states in enumerate(self.statuses) if state in states.split(",")]
+        return numpy.isin(self.status, codes)
+
+
+    def elements(self, typ: str) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        gets all elements of type
+        :param typ: CLASS | TEACHER | SUBJECT | ROOM | STUDENT
+        :return: (row of period, element id)
+        """
+
+        mask = self.element_type == self.types.index(typ)
+        return self.element_period[mask], self.element_id[mask]
+
+
+    # analytics
+    def hours_per_week(self, typ: str, hour: int = 60) -> dict[tuple[int, str], float]:
+        """
+        sums period time per element and week, cancelled periods are skipped
+        :param typ: CLASS | TEACHER | SUBJECT | ROOM
+        :param hour: default 60, minutes of one hour, 45 for school hours
+        :return: dict {(element id, "YYYY-MM-DD" of monday): hours}
+        """
+
+        rows, ids = self.elements(typ)
+        keep = ~self.has_status("CANCELLED")[rows]
+        rows, ids = rows[keep], ids[keep]
+
+        keys = numpy.stack([ids, self.week[rows]], axis=1)
+        keys, inverse = numpy.unique(keys, axis=0, return_inverse=True)
+        hours = numpy.bincount(inverse.ravel(), weights=self.minutes[rows], minlength=len(keys)) / hour
+
+        mondays = keys[:, 1].astype("datetime64[D]").astype(str)
+        return {(int(ID), str(monday)): float(value) for (ID, _), monday, value in zip(keys, mondays, hours)}
+
+
+    def cancellation_rate(self, typ: str = "CLASS") -> dict[int, float]:
+        """
+        share of cancelled periods per element
+        :param typ: default CLASS, CLASS | TEACHER | SUBJECT | ROOM
+        :return: dict {element id: rate}
+        """
+
+        rows, ids = self.elements(typ)
+        cancelled = self.has_status("CANCELLED")[rows]
+
+        keys, inverse = numpy.unique(ids, return_inverse=True)
+        total = numpy.bincount(inverse, minlength=len(keys))
+        hits = numpy.bincount(inverse, weights=cancelled, minlength=len(keys))
+
+        return {int(ID): float(rate) for ID, rate in zip(keys, hits / total)}
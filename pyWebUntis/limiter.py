@@ -0,0 +1,179 @@
+import sys
+import threading
+import time
+
+import pyWebUntis.error
+import pyWebUntis.metrics
+
+
+
+
+class Limiter:
+    """
+    Token bucket and circuit breaker of one server, owned by its Transport.
+    The bucket allows `rate` requests per second with bursts of `burst`. The rate is halved on
+    HTTP 429/503 and after `unspecified_limit` UnspecifiedError (-8998) in a row and grows back by
+    a tenth of `rate` with every success.
+    After `threshold` failures in a row the circuit opens: requests fail fast with
+    ServerUnavailable for `cooldown` seconds, then one request probes the server. A failed probe
+    opens the circuit again with doubled cooldown up to `cooldown_max`.
+    """
+
+    # status codes and untis codes which mean the server is overloaded or down
+    throttle_status = {429, 503}
+    failure_status = {429, 500, 502, 503, 504}
+    failure_codes = {"-8998"}
+
+
+    def __init__(self, server: str = None, rate: float = 20, burst: int = 40, min_rate: float = 0.5,
+                 unspecified_limit: int = 3, threshold: int = 5, cooldown: float = 5, cooldown_max: float = 120):
+        """
+        Init function for Limiter class.
+        :param server: name of server, used in errors and metrics
+        :param rate: default 20, requests per second, None for no rate limit
+        :param burst: default 40, requests sent without waiting
+        :param min_rate: default 0.5, lowest rate after slowing down
+        :param unspecified_limit: default 3, UnspecifiedError in a row which slow down
+        :param threshold: default 5, failures in a row which open the circuit
+        :param cooldown: default 5, seconds the circuit stays open first
+        :param cooldown_max: default 120, max seconds the circuit stays open
+        """
+
+        self.server = server
+        self.rate = self.max_rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.unspecified_limit = unspecified_limit
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.cooldown_max = cooldown_max
+
+        self.tokens = float(burst)
+        self.failures = 0
+        self.unspecified = 0
+        # circuit: closed while opened_until is 0
+        self.opened_until = 0.0
+        self._open_for = cooldown
+        self._probing = False
+        self._paused_until = 0.0
+
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    @property
+    def open(self) -> bool:
+        """True while requests fail fast"""
+        return self.opened_until > time.monotonic() or self._probing
+
+
+    def reserve(self) -> float:
+        """
+        Takes one token
+        :return: seconds to wait before sending
+        :raise ServerUnavailable while the circuit is open
+        """
+
+        with self._lock:
+            now = time.monotonic()
+
+            if self.opened_until:
+                if now < self.opened_until or self._probing:
+                    raise pyWebUntis.error.ServerUnavailable(self.server, max(self.opened_until - now, 0.0))
+                # half open, this request probes the server
+                self._probing = True
+
+            if self.max_rate is None:
+                return max(self._paused_until - now, 0.0)
+
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.tokens -= 1
+
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+
+    def record(self, error: BaseException = None):
+        """
+        Records result of one request
+        :param error: raised error, None on success
+        """
+
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None) or getattr(error, "status", None)
+        code = getattr(error, "code", None) if isinstance(error, pyWebUntis.error.UntisError) else None
+
+        if error is None or code is not None and code not in self.failure_codes:
+            # answered, also for untis errors like wrong password
+            self._success()
+        elif status in self.failure_status or code in self.failure_codes or status is None and self._transient(error):
+            headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+            self._failure(status, code, headers.get("retry-after", ""))
+        else:
+            # e.g. 404 or a bug in caller, says nothing about the health of the server
+            with self._lock:
+                self._probing = False
+
+
+    @staticmethod
+    def _transient(error: BaseException) -> bool:
+        """
+        helper function checks for connection errors and timeouts of requests, aiohttp and asyncio
+        client errors like an invalid url say nothing about the server
+        """
+
+        # http clients are looked up, not imported: their errors can only exist if they are loaded
+        # asyncio.TimeoutError is TimeoutError
+        types = [ConnectionError, TimeoutError]
+
+        requests = sys.modules.get("requests")
+        requests and types.extend((requests.ConnectionError, requests.Timeout))
+
+        aiohttp = sys.modules.get("aiohttp")
+        aiohttp and types.append(aiohttp.ClientConnectionError)
+
+        return isinstance(error, tuple(types))
+
+
+    def _success(self):
+        with self._lock:
+            self.failures = 0
+            self.unspecified = 0
+            if self.max_rate is not None:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+            if self.opened_until:
+                self.opened_until = 0.0
+                self._open_for = self.cooldown
+                self._probing = False
+                pyWebUntis.metrics.registry.count("untis.circuit", server=self.server, state="closed")
+
+
+    def _failure(self, status: int, code: str, after: str):
+        with self._lock:
+            now = time.monotonic()
+            self.failures += 1
+
+            slow = status in self.throttle_status
+            if code in self.failure_codes:
+                self.unspecified += 1
+                slow = self.unspecified >= self.unspecified_limit
+                if slow:
+                    self.unspecified = 0
+
+            if slow and self.max_rate is not None:
+                self.rate = max(self.min_rate, self.rate / 2)
+                pyWebUntis.metrics.registry.count("untis.throttle", server=self.server)
+
+            # server told when to come back
+            if after.isdigit():
+                self._paused_until = max(self._paused_until, now + float(after))
+
+            if self._probing or self.failures >= self.threshold:
+                # failed probe doubles the cooldown
+                if self._probing:
+                    self._open_for = min(self._open_for * 2, self.cooldown_max)
+                self.opened_until = now + self._open_for
+                self._probing = False
+                pyWebUntis.metrics.registry.count("untis.circuit", server=self.server, state="open")
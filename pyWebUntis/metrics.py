@@ -0,0 +1,309 @@
+import bisect
+import contextvars
+import threading
+import time
+
+
+
+
+class Histogram:
+    """
+    Fixed bucket histogram, buckets are upper bounds
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+    def snapshot(self) -> dict:
+        """
+        :return: dict {count, sum, buckets: {upper bound: cumulative count}}
+        """
+
+        buckets, total = {}, 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            buckets[bound] = total
+
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+
+
+class Span:
+    """
+    Measures one request, attributes get filled by API and Transport while it is active.
+    """
+
+    __slots__ = ("metrics", "name", "attributes", "start", "duration", "error", "_token", "_spans")
+
+    def __init__(self, metrics: "Metrics", name: str, attributes: dict):
+        self.metrics = metrics
+        self.name = name
+        self.attributes = attributes
+        self.start = 0.0
+        self.duration = 0.0
+        self.error = None
+
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+
+    def add(self, key: str, value: float = 1):
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+
+    def __enter__(self) -> "Span":
+        self._spans = [tracer.start_span(self.name, attributes=dict(self.attributes))
+                       for tracer in self.metrics.tracers]
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.duration = time.perf_counter() - self.start
+        _current.reset(self._token)
+        self.error = exc_val
+
+        for span in self._spans:
+            for key, value in self.attributes.items():
+                span.set_attribute(key, value)
+            exc_val is not None and span.record_exception(exc_val)
+            span.end()
+
+        self.metrics._finish(self)
+
+
+
+
+class _NoopSpan:
+    """
+    Span used while metrics are disabled, does nothing
+    """
+
+    __slots__ = ()
+
+    def set(self, key: str, value):
+        pass
+
+
+    def add(self, key: str, value: float = 1):
+        pass
+
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+NOOP = _NoopSpan()
+_current: contextvars.ContextVar = contextvars.ContextVar("pyWebUntis_span", default=NOOP)
+
+
+def current():
+    """
+    Gets active span of request, NOOP if there is none
+    :return: Span
+    """
+
+    return _current.get()
+
+
+
+
+class Metrics:
+    """
+    Instrumentation of requests.
+    hooks: callables called with every finished Span
+    tracers: OpenTelemetry style tracers, start_span(name, attributes) -> span with set_attribute,
+             record_exception and end
+    collect: if True finished spans and cache lookups are aggregated, see snapshot()
+    Without hooks, tracers and collect every span is NOOP.
+    """
+
+    # milliseconds
+    latency_buckets = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+    # bytes
+    size_buckets = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+    # span attributes aggregated as histograms
+    observed = {"request_bytes": size_buckets, "response_bytes": size_buckets, "decode_ms": latency_buckets}
+
+
+    def __init__(self):
+        self.hooks = []
+        self.tracers = []
+        self.collect = False
+        self.enabled = False
+
+        self._histograms: dict[tuple[str, str], Histogram] = {}
+        self._counters: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+
+    def _update(self):
+        self.enabled = bool(self.hooks or self.tracers or self.collect)
+
+
+    def add_hook(self, hook):
+        """
+        :param hook: callable called with every finished Span
+        """
+        self.hooks.append(hook)
+        self._update()
+
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+        self._update()
+
+
+    def add_tracer(self, tracer):
+        """
+        :param tracer: e.g. opentelemetry.trace.get_tracer("pyWebUntis")
+        """
+        self.tracers.append(tracer)
+        self._update()
+
+
+    def remove_tracer(self, tracer):
+        self.tracers.remove(tracer)
+        self._update()
+
+
+    def enable(self, collect: bool = True):
+        """
+        enables or disables the built in aggregation
+        :param collect: default True
+        """
+        self.collect = collect
+        self._update()
+
+
+    def span(self, name: str, **attributes):
+        """
+        Creates span for one request
+        :param name: e.g. untis.request
+        :param attributes: e.g. method, server
+        :return: Span, NOOP if disabled
+        """
+
+        if not self.enabled:
+            return NOOP
+
+        return Span(self, name, attributes)
+
+
+    def count(self, name: str, value: float = 1, **labels):
+        """
+        increases counter, e.g. count("cache", cache="search", result="hit")
+        :param name: name of counter
+        :param value: default 1
+        :param labels: labels of counter
+        """
+
+        if not self.collect:
+            return
+
+        key = (name, self._labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+
+    def observe(self, name: str, value: float, buckets: tuple = latency_buckets, **labels):
+        """
+        adds value to histogram
+        :param name: name of histogram
+        :param value: value
+        :param buckets: default latency_buckets, only used on creation
+        :param labels: labels of histogram
+        """
+
+        if not self.collect:
+            return
+
+        key = (name, self._labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+
+    @staticmethod
+    def _labels(labels: dict) -> str:
+        return ",".join(f"{key}={value}" for key, value in sorted(labels.items()))
+
+
+    def _finish(self, span: Span):
+        """
+        aggregates finished span and calls hooks
+        """
+
+        for hook in self.hooks:
+            hook(span)
+
+        if not self.collect:
+            return
+
+        method = span.attributes.get("method", "")
+        self.observe(f"{span.name}.latency_ms", span.duration * 1000, method=method)
+        self.count(f"{span.name}.requests", method=method)
+
+        for key, buckets in self.observed.items():
+            key in span.attributes and self.observe(f"{span.name}.{key}", span.attributes[key], buckets,
+                                                    method=method)
+
+        span.attributes.get("retries") and self.count(f"{span.name}.retries", span.attributes["retries"],
+                                                      method=method)
+
+        if span.error is not None:
+            code = getattr(span.error, "code", None) or type(span.error).__name__
+            self.count(f"{span.name}.errors", method=method, code=code)
+
+
+    def snapshot(self) -> dict:
+        """
+        Gets aggregated values
+        :return: dict {histograms: {name: {labels: {count, sum, buckets}}}, counters: {name: {labels: value}}}
+        """
+
+        snapshot = {"histograms": {}, "counters": {}}
+        with self._lock:
+            for (name, labels), histogram in self._histograms.items():
+                snapshot["histograms"].setdefault(name, {})[labels] = histogram.snapshot()
+
+            for (name, labels), value in self._counters.items():
+                snapshot["counters"].setdefault(name, {})[labels] = value
+
+        return snapshot
+
+
+    def reset(self):
+        """
+        drops aggregated values
+        """
+
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# default registry used by the library
+registry = Metrics()
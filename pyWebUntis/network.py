@@ -1,37 +1,69 @@
+from __future__ import annotations
+
+import concurrent.futures
+import datetime
+import functools
+import json
 import time
-import pendulum
-from typing import Union
-import requests
+from typing import TYPE_CHECKING, Union
 import base64
+import pyWebUntis.auth
+import pyWebUntis.cache
 import pyWebUntis.error
+import pyWebUntis.metrics
+import pyWebUntis.transport
+from pyWebUntis import utils
+
+# pendulum and requests are imported on first use, keeps importing the package cheap
+if TYPE_CHECKING:
+    import pendulum
+    import requests
 
 
 
 
 class API:
     # requests data
-    session = requests.Session()
-    session.headers = {
-        "content-type": "application/json; charset=UTF-8",
-        "accept-encoding": "gzip",
-        "user-agent": "okhttp/4.11.0"
-    }
+    headers = pyWebUntis.transport.Transport.headers
+    transport: pyWebUntis.transport.Transport
+
+    # methods which change data on server, never retried
+    unsafe_methods = {"createImmediateAbsence2017", "deleteAbsence2017", "submitAbsencesChecked2017",
+                      "submitLessonTopic"}
+
+    # identical requests running at the same time share one request, see _request_key
+    coalesce: bool = True
+    inflight = utils.SingleFlight()
+
+    # server: True | False if json rpc batches are accepted, see Batch
+    batch_support: dict[str, bool] = {}
+
+    # answers of the rest view endpoints, shared by all API, see _get_request
+    rest_cache = pyWebUntis.cache.RestCache()
 
     server: str = None
     untisID = "untis-mobile-blackberry-2.7.4"
 
+    # endpoints, can be pointed to a local stand-in server, see also pyWebUntis.search.SchoolSearch.url
+    scheme = "https"
+
     # auth data default anonymous
     username: str
     password: str
+    credentials: pyWebUntis.auth.AuthManager
 
 
-    def __init__(self: object, server: str , loginName:str, username:str="#anonymous#", password:str="", **kwargs):
+    def __init__(self: object, server: str , loginName:str, username:str="#anonymous#", password:str="",
+                 transport: pyWebUntis.transport.Transport = None,
+                 credentials: pyWebUntis.auth.AuthManager = None, **kwargs):
         """
         Init function for School class. Stores only Api related information specific attributes and functions
         :param server: base server url
         :param loginName: identifier name from school
         :param username: username of used default "#anonymous#"
         :param password: password of user default ""
+        :param transport: default shared Transport of server, connection pool, timeouts and retries
+        :param credentials: default shared AuthManager, caches the shared secret of the user
         :param kwargs: will get ignored
         """
 
@@ -40,15 +72,24 @@ class API:
 
         self.username = username
         self.password = password
+        self.credentials = credentials or pyWebUntis.auth.default
+
+        self.transport = transport or pyWebUntis.transport.Transport.for_server(server)
+
+
+    @property
+    def session(self) -> requests.Session:
+        """requests session of transport, created on first request"""
+        return self.transport.session
 
 
     # helper functions
-    def get_school_data(self):
+    def _school_search_request(self) -> dict:
         """
-        Search school with the given string.
-        :return: list with school objects
+        helper function creates the json body for the school search
+        :return: dict
         """
-        baseurl = "https://schoolsearch.webuntis.com/schoolquery2"
+
         json = {
             "id": f"{self.untisID}",
             "jsonrpc": "2.0",
@@ -58,24 +99,47 @@ class API:
             }]
         }
 
-        data = self.session.post(url=baseurl, json=json).json()
-        return data["result"]["schools"][0]
+        return json
+
+
+    def get_school_data(self):
+        """
+        Search school with the given string.
+        Results are cached and shared with storage.search_school, see pyWebUntis.search.SchoolSearch
+        :return: school with loginName
+        :raise UntisError InvalidSchool when no school has loginName
+        """
+
+        # imported here, search imports network
+        import pyWebUntis.search
+
+        return self._select_school(pyWebUntis.search.default.search(self.loginName))
+
+
+    def _select_school(self, schools: list[dict]) -> dict:
+        """
+        helper function picks school with loginName from search results
+        results can be ordered differently than by the server, see SchoolSearch._cached
+        :param schools: schools of searchSchool
+        :return: dict
+        :raise UntisError InvalidSchool when no school has loginName
+        """
+
+        for school in schools:
+            if school.get("loginName") == self.loginName:
+                return school
+
+        raise pyWebUntis.error.UntisError(code=-8500, message=f"no school with loginName {self.loginName}")
 
 
     def auth(self) -> dict:
         """
         helper function creates auth dict
+        otp is calculated from the cached shared secret of the user, 0 for anonymous
         :return: dict
         """
 
-        # TODO do some research how calculate otp for non anonymous user
-        auth = {
-            "clientTime": int(time.time() * 1000),
-            "otp": 0,
-            "user": f"{self.username}"
-        }
-
-        return auth
+        return self.credentials.auth(self)
 
 
     def _getMoSofromDate(self, date: pendulum.datetime) -> list[pendulum.date, pendulum.date]:
@@ -96,9 +160,9 @@ class API:
 
 
     def date_iter(self,
-                   start: pendulum.date = pendulum.today(),
-                   end: pendulum.date = pendulum.today().add(months=6),
-                   delta: pendulum.duration = pendulum.duration(weeks=1)
+                   start: pendulum.date = None,
+                   end: pendulum.date = None,
+                   delta: pendulum.duration = None
                    ) -> list[pendulum.date, pendulum.date]:
         """
         Iter dates from today to end of current school year
@@ -108,6 +172,12 @@ class API:
         :return: list[ monday, sunday ] as pendulum.date
         """
 
+        import pendulum
+
+        start = start or pendulum.today()
+        end = end or pendulum.today().add(months=6)
+        delta = delta or pendulum.duration(weeks=1)
+
         current = start
         while current < end:
 
@@ -118,17 +188,16 @@ class API:
 
     ## API functions
     # default requests function
-    def _requests(self, method: str, params: dict = None, auth:bool=True) -> dict:
+    def _build_request(self, method: str, params: dict = None, auth:bool=True) -> tuple[str, dict, dict]:
         """
-        Creates default requests for untis server
+        Creates url, url params and json body for a request to the untis server
         :param method: method which get used
         :param params: params for request
         :param auth: default True only false for login
-        :return: dict
-        :raise UntisError when requests return error
+        :return: url, url_params, data
         """
 
-        url = f"https://{self.server}/WebUntis/jsonrpc_intern.do"
+        url = f"{self.scheme}://{self.server}/WebUntis/jsonrpc_intern.do"
         url_params = {
             "school": f"{self.loginName}",
             "m": f"{method}",
@@ -143,7 +212,10 @@ class API:
                 "auth": self.auth()
             }]
 
-        params and values[0].update(params)
+        if params:
+            # requests without auth, e.g. getAppSharedSecret, only have the params
+            values = values or [{}]
+            values[0].update(params)
 
 
         data = {
@@ -153,8 +225,17 @@ class API:
             "params": values
         }
 
-        result = self.session.post(url=url, params=url_params, json=data)
-        result = result.json()
+        return url, url_params, data
+
+
+    @staticmethod
+    def _parse_result(result: dict) -> dict:
+        """
+        Unpacks the json rpc answer of the untis server
+        :param result: decoded json answer
+        :return: dict
+        :raise UntisError when requests return error
+        """
 
         if "error" in result:
             error = result["error"]
@@ -163,6 +244,73 @@ class API:
         return result["result"]
 
 
+    def _requests(self, method: str, params: dict = None, auth:bool=True) -> dict:
+        """
+        Creates default requests for untis server
+        :param method: method which get used
+        :param params: params for request
+        :param auth: default True only false for login
+        :return: dict
+        :raise UntisError when requests return error
+        """
+
+        with pyWebUntis.metrics.registry.span("untis.request", method=method, server=self.server):
+            if method in self.unsafe_methods:
+                return self.transport.limited(self._request_once, method, params, auth)
+
+            if not self.coalesce:
+                return self.transport.retry(self._request_once, method, params, auth)
+
+            key = self._request_key(method, params, auth)
+            return self.inflight.do(key, self.transport.retry, self._request_once, method, params, auth)
+
+
+    def _request_key(self, method: str, params: dict = None, auth:bool=True) -> tuple:
+        """
+        helper function creates key of request for coalescing
+        the auth block is replaced by the user, clientTime changes on every call
+        :return: tuple
+        """
+
+        params = json.dumps(params, sort_keys=True, default=str)
+        return self.server, self.loginName, auth and self.username, method, params
+
+
+    def _request_once(self, method: str, params: dict = None, auth:bool=True) -> dict:
+        """
+        Sends one request to untis server, see _requests
+        :raise UntisError when requests return error
+        """
+
+        start = time.time()
+        url, url_params, data = self._build_request(method, params, auth)
+
+        result = self.transport.post_json(url=url, params=url_params, json=data)
+        try:
+            return self._parse_result(result)
+        except pyWebUntis.error.UntisError as error:
+            # shared secret is outdated, sent once more with a new one
+            if not (auth and self.credentials.invalidate(self, error, start)):
+                raise
+
+        url, url_params, data = self._build_request(method, params, auth)
+        return self._parse_result(self.transport.post_json(url=url, params=url_params, json=data))
+
+
+    def batch(self) -> "Batch":
+        """
+        Creates batch of calls which get sent in one request
+        usage:
+            with api.batch() as batch:
+                user = batch.call("getUserData2017", {...})
+                colors = batch.call("getColors2017")
+            user.result()
+        :return: Batch
+        """
+
+        return Batch(self)
+
+
     def createImmediateAbsence(self):
         """"""
         """ params
@@ -309,6 +457,16 @@ class API:
         :return: dict {key : {foreColor, backColor}}
         """
         result = self._requests(method="getColors2017")
+        return self._parse_colors(result)
+
+
+    @staticmethod
+    def _parse_colors(result: dict) -> dict:
+        """
+        helper function sorts colors by type
+        :param result: answer of getColors2017
+        :return: dict {key : {foreColor, backColor}}
+        """
         result = result["appcolors"]
 
         colors = {}
@@ -318,12 +476,13 @@ class API:
         return colors
 
 
-    def getMessagesOfDay(self, date: pendulum.date = pendulum.today()):
+    def getMessagesOfDay(self, date: pendulum.date = None):
         """"""
         # TODO
         """ params
-        val date: UntisDate,
+        val date: UntisDate, default today
         """
+        date = date or datetime.date.today()
         params = {
             "date": f"{date:%Y-%m-%d}"
         }
@@ -344,8 +503,8 @@ class API:
         """
 
         # get exams for given school year or for time range?
-        isinstance(startDate, pendulum.date) and (startDate := f"{startDate:%Y-%m-%d}")
-        isinstance(endDate, pendulum.date) and (endDate := f"{endDate:%Y-%m-%d}")
+        isinstance(startDate, datetime.date) and (startDate := f"{startDate:%Y-%m-%d}")
+        isinstance(endDate, datetime.date) and (endDate := f"{endDate:%Y-%m-%d}")
 
         params = {
             "startDate": startDate,
@@ -364,8 +523,8 @@ class API:
         """"""
 
         # TODO: See getExams2017
-        isinstance(startDate, pendulum.date) and (startDate := f"{startDate:%Y-%m-%d}")
-        isinstance(endDate, pendulum.date) and (endDate := f"{endDate:%Y-%m-%d}")
+        isinstance(startDate, datetime.date) and (startDate := f"{startDate:%Y-%m-%d}")
+        isinstance(endDate, datetime.date) and (endDate := f"{endDate:%Y-%m-%d}")
 
         params = {
             "startDate": startDate,
@@ -382,16 +541,21 @@ class API:
                      startDate: Union[pendulum.datetime, str],
                      endDate: Union[pendulum.datetime, str],
                      ID: Union[str, int],
-                     typ: str):
+                     typ: str,
+                     masterDataTimestamp: int = 0,
+                     timetableTimestamp: int = 0,
+                     timetableTimestamps: list[int] = None):
         """
 
         :param startDate: startdate
         :param endDate: enddate
         :param ID: id from klasse | student
         :param typ: type depents klasse | student
-        :param masterDataTimestamp # TODO: Try how the response behaves depending on changes to this value
-        :param timetableTimestamp # TODO: research see above
-        :param timetableTimestamps # TODO: research see above
+        :param masterDataTimestamp: default 0, timeStamp of known masterData,
+                                    result["masterData"] only contains entries changed since then
+        :param timetableTimestamp: default 0, timestamp of known timetable
+        :param timetableTimestamps: default 7 times 0, timestamps of known days,
+                                    days with unchanged timestamp are not sent again
         :return:
         """
 
@@ -403,9 +567,9 @@ class API:
         # Todo research
 
         default = {
-            "masterDataTimestamp": 0,
-            "timetableTimestamp": 0,
-            "timetableTimestamps": [
+            "masterDataTimestamp": masterDataTimestamp,
+            "timetableTimestamp": timetableTimestamp,
+            "timetableTimestamps": timetableTimestamps or [
                 0,
                 0,
                 0,
@@ -429,15 +593,46 @@ class API:
         return result
 
     # some special api functions?
+    def _build_get_request(self, path) -> tuple[str, dict]:
+        """
+        Creates url and headers for the rest endpoints
+        :param path: path of endpoint
+        :return: url, headers
+        """
+        url = f"{self.scheme}://{self.server}{path}?school={self.loginName}"
+        return url, _rest_headers(self.loginName)
+
+
     def _get_request(self, path):
-        """"""
-        headers = {
-            "anonymous-school-base64": base64.b64encode(bytes(self.loginName,"UTF8")),
-            "user-agent": "android"
-        }
-        url = f"https://{self.server}{path}?school={self.loginName}"
-        result = requests.get(url=url, headers=headers)
-        return result.json()
+        """
+        Gets rest endpoint over the pooled transport
+        answers are cached in rest_cache and revalidated with ETag / Last-Modified after the ttl of path
+        :param path: path of endpoint
+        :return: decoded answer, shared with other callers
+        :raise requests.HTTPError for error answers
+        """
+
+        url, headers = self._build_get_request(path)
+
+        entry = self.rest_cache.lookup(url)
+        if self.rest_cache.fresh(entry, path):
+            return entry[3]
+
+        with pyWebUntis.metrics.registry.span("untis.rest", method=path, server=self.server) as span:
+            response = self.transport.retry(self.transport.get, url,
+                                            headers={**headers, **self.rest_cache.conditional(entry)})
+
+            if response.status_code == 304 and entry is not None:
+                span.set("status", 304)
+                self.rest_cache.store(url, response.headers, None, entry)
+                return entry[3]
+
+            # error answers are raised and never cached
+            response.raise_for_status()
+
+            data = self.transport.decode(response)
+            response.status_code < 300 and self.rest_cache.store(url, response.headers, data)
+            return data
 
 
     def todo_1(self):
@@ -452,3 +647,178 @@ class API:
         path = "/WebUntis/api/rest/view/v2/home"
         return self._get_request(path)
 
+
+
+
+
+@functools.lru_cache(maxsize=1024)
+def _rest_headers(loginName: str) -> dict:
+    """
+    helper function creates headers of the rest endpoints once per school
+    the dict is shared and must not be changed
+    """
+
+    return {
+        "anonymous-school-base64": base64.b64encode(bytes(loginName, "UTF8")).decode(),
+        "user-agent": "android"
+    }
+
+
+
+
+class Batch:
+    """
+    Queues json rpc calls and sends them as one json rpc 2.0 batch array.
+    If the server rejects batches the calls are sent as concurrent single requests,
+    the decision is remembered per server in API.batch_support.
+    """
+
+    api: API
+    calls: list[tuple[str, dict, bool, concurrent.futures.Future]]
+
+
+    def __init__(self, api: API):
+        """
+        Init function for Batch class.
+        :param api: api of school
+        """
+
+        self.api = api
+        self.calls = []
+
+
+    def __enter__(self) -> "Batch":
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        exc_type is None and self.send()
+
+
+    def call(self, method: str, params: dict = None, auth:bool=True) -> concurrent.futures.Future:
+        """
+        Queues call
+        :param method: method which get used
+        :param params: params for request
+        :param auth: default True only false for login
+        :return: Future with result, raises UntisError of call on result()
+        """
+
+        future = concurrent.futures.Future()
+        self.calls.append((method, params, auth, future))
+        return future
+
+
+    def send(self):
+        """
+        Sends all queued calls and sets their futures
+        the batch is sent once without retry, calls of unsafe_methods are always sent as single requests
+        """
+
+        import requests
+
+        calls, self.calls = self.calls, []
+        if not calls:
+            return
+
+        # a rejected batch gets sent again as single calls, so calls which change data never join it
+        single = [call for call in calls if call[0] in API.unsafe_methods]
+        calls = [call for call in calls if call[0] not in API.unsafe_methods]
+
+        server = self.api.server
+        if len(calls) > 1 and API.batch_support.get(server, True):
+            start = time.time()
+            try:
+                with pyWebUntis.metrics.registry.span("untis.batch", method="batch", server=server, calls=len(calls)):
+                    responses = self.api.transport.limited(self._send_batch, calls)
+            except (requests.ConnectionError, requests.Timeout, pyWebUntis.error.ServerUnavailable):
+                # server is not reachable, single calls will report it
+                responses = False
+            except requests.RequestException:
+                # e.g. HTTP 500 for json arrays
+                responses = None
+
+            if responses is not False:
+                API.batch_support[server] = responses is not None
+
+            if responses:
+                calls = [call for call, response in zip(calls, responses) if not self._answer(call, response, start)]
+
+        calls += single
+        calls and self._send_single(calls)
+
+
+    def _answer(self, call: tuple, response: dict, start: float) -> bool:
+        """
+        helper function sets answer of a batched call on its future
+        :param call: queued call
+        :param response: answer of call
+        :param start: time.time() before the batch was built
+        :return: False if the call has to be sent again because the shared secret was outdated
+        """
+
+        method, params, auth, future = call
+        try:
+            future.set_result(API._parse_result(response))
+        except pyWebUntis.error.UntisError as error:
+            if auth and self.api.credentials.invalidate(self.api, error, start):
+                return False
+            future.set_exception(error)
+
+        return True
+
+
+    def _send_batch(self, calls: list) -> list[dict]:
+        """
+        Sends calls as one batch
+        :param calls: queued calls
+        :return: answers in order of calls, None if the server rejected the batch
+        """
+
+        data = []
+        for i, (method, params, auth, _) in enumerate(calls):
+            url, url_params, call = self.api._build_request(method, params, auth)
+            call["id"] = f"{i}"
+            data.append(call)
+
+        response = self.api.transport.post(url=url, params=url_params, data=self.api.transport.codec.dumps(data))
+        if not response.ok:
+            return None
+
+        try:
+            result = self.api.transport.decode(response)
+        except ValueError:
+            return None
+
+        if not isinstance(result, list):
+            return None
+
+        answers = {answer.get("id"): answer for answer in result if isinstance(answer, dict)}
+        if answers.keys() != {f"{i}" for i in range(len(calls))}:
+            return None
+
+        return [answers[f"{i}"] for i in range(len(calls))]
+
+
+    def _send_single(self, calls: list):
+        """
+        Sends calls as concurrent single requests
+        :param calls: queued calls
+        """
+
+        workers = min(len(calls), self.api.transport.pool_maxsize)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            for method, params, auth, future in calls:
+                pool.submit(self._set, future, lambda call=(method, params, auth): self.api._requests(*call))
+
+
+    @staticmethod
+    def _set(future: concurrent.futures.Future, function):
+        """
+        helper function sets result or error of function on future
+        """
+
+        try:
+            future.set_result(function())
+        except Exception as error:
+            future.set_exception(error)
@@ -0,0 +1,186 @@
+import collections
+import threading
+import time
+
+import pyWebUntis.error
+import pyWebUntis.metrics
+import pyWebUntis.transport
+from pyWebUntis import network, utils
+
+
+
+
+class SchoolSearch:
+    """
+    Cached school search on schoolsearch.webuntis.com.
+    Results are kept for `ttl` seconds in a LRU of `size` queries. A longer query gets answered
+    by filtering the cached result of its prefix if that result was complete. The filter over
+    displayName, address and loginName only approximates the matching of the server and keeps the
+    order of the prefix result, not the ranking of the server. Identical queries which are running
+    at the same time share one request.
+    """
+
+    url = "https://schoolsearch.webuntis.com/schoolquery2"
+
+    # errors which are cached like results, TooManyResults
+    cached_codes = {"-6003"}
+
+    transport: pyWebUntis.transport.Transport
+    ttl: float
+    size: int
+
+
+    def __init__(self, transport: pyWebUntis.transport.Transport = None, ttl: float = 300, size: int = 256):
+        """
+        Init function for SchoolSearch class.
+        :param transport: default shared Transport of schoolsearch.webuntis.com
+        :param ttl: default 5 minutes, seconds a result is kept
+        :param size: default 256, max count of cached queries
+        """
+
+        self.transport = transport or pyWebUntis.transport.Transport.for_server("schoolsearch.webuntis.com")
+        self.ttl = ttl
+        self.size = size
+
+        # query: (time, list of schools | UntisError)
+        self._results = collections.OrderedDict()
+        self._running = utils.SingleFlight()
+        self._lock = threading.Lock()
+
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+
+    @staticmethod
+    def _matches(school: dict, terms: list[str]) -> bool:
+        """
+        helper function checks if all terms are in the searchable fields of school
+        :param school: school from searchSchool
+        :param terms: lower case terms of query
+        :return: bool
+        """
+
+        text = " ".join(f"{school.get(key, '')}" for key in ("displayName", "address", "loginName")).lower()
+        return all(term in text for term in terms)
+
+
+    def _cached(self, query: str) -> list[dict]:
+        """
+        helper function looks up query or its longest complete prefix in cache
+        results filtered from a prefix approximate the server, see SchoolSearch
+        needs to be called with lock
+        :param query: normalized query
+        :return: list of schools or None
+        """
+
+        now = time.monotonic()
+        for end in range(len(query), 0, -1):
+            prefix = query[:end]
+            entry = self._results.get(prefix)
+
+            if entry is None:
+                continue
+
+            stored, result = entry
+            if now - stored > self.ttl:
+                del self._results[prefix]
+                continue
+
+            self._results.move_to_end(prefix)
+
+            if prefix == query:
+                if isinstance(result, Exception):
+                    raise result
+                return result
+
+            # truncated results can not be filtered for a longer query
+            if isinstance(result, Exception):
+                continue
+
+            terms = query.split()
+            return [school for school in result if self._matches(school, terms)]
+
+        return None
+
+
+    def _store(self, query: str, result):
+        """
+        helper function stores result and drops oldest queries
+        needs to be called with lock
+        """
+
+        self._results[query] = (time.monotonic(), result)
+        self._results.move_to_end(query)
+
+        while len(self._results) > self.size:
+            self._results.popitem(last=False)
+
+
+    def _request(self, query: str) -> list[dict]:
+        """
+        Search school with the given string on server
+        :param query: String with search querry
+        :return: list of schools
+        :raise UntisError with TooManyResults when query is not specific enough
+        """
+
+        json = {
+            "id": f"blackberry",
+            "jsonrpc": "2.0",
+            "method": "searchSchool",
+            "params": [{
+                "search": f"{query}"
+            }]
+        }
+
+        data = self.transport.retry(self.transport.post_json, url=self.url, json=json)
+        return network.API._parse_result(data)["schools"]
+
+
+    def search(self, query: str) -> list[dict]:
+        """
+        Search school with the given string.
+        :param query: String with search querry
+        :return: list of schools
+        :raise UntisError with TooManyResults when query is not specific enough
+        """
+
+        query = self._normalize(query)
+
+        with self._lock:
+            result = self._cached(query)
+
+        pyWebUntis.metrics.registry.count("cache", cache="search", result="miss" if result is None else "hit")
+        if result is not None:
+            return result
+
+        return self._running.do(query, self._fetch, query)
+
+
+    def _fetch(self, query: str) -> list[dict]:
+        """
+        helper function requests query and stores result in cache
+        :param query: normalized query
+        :return: list of schools
+        """
+
+        try:
+            result = self._request(query)
+        except pyWebUntis.error.UntisError as error:
+            # TooManyResults keeps typing the same short query from hitting the server,
+            # other errors like UnspecifiedError are left after retries and not cached
+            if error.code in self.cached_codes:
+                with self._lock:
+                    self._store(query, error)
+            raise
+
+        with self._lock:
+            self._store(query, result)
+
+        return result
+
+
+# default cache used by storage.search_school
+default = SchoolSearch()
@@ -1,15 +1,80 @@
-from typing import Union
+from __future__ import annotations
 
-import pendulum
-import requests
-from pyWebUntis import network
+import collections
+import concurrent.futures
+import contextlib
+import datetime
+import itertools
+import threading
+import time
+from typing import TYPE_CHECKING, Union
+
+import pyWebUntis.cache
+import pyWebUntis.error
+import pyWebUntis.search
+import pyWebUntis.transport
+from pyWebUntis import dates, network
+
+if TYPE_CHECKING:
+    import pendulum
+
+
+
+
+def _to_date(date:Union[datetime.date, str]) -> pendulum.Date:
+    """
+    helper function converts date, datetime or iso string to pendulum.Date
+    :param date: any date
+    :return: pendulum.Date
+    """
+
+    import pendulum
+
+    isinstance(date, str) and (date := dates.parse_date(date))
+    return pendulum.date(date.year, date.month, date.day)
+
+
+
+
+class _Elements:
+    """
+    Descriptor resolving the element ids of a Stunde on first access.
+    The result gets cached in the slot `_<name>` of the Stunde.
+    """
+
+    def __init__(self, typ:str, parameter:str):
+        self.typ = typ
+        self.parameter = parameter
+
+
+    def __set_name__(self, owner, name):
+        self.slot = f"_{name}"
+
+
+    def __get__(self, stunde, owner=None):
+        if stunde is None:
+            return self
+
+        try:
+            return getattr(stunde, self.slot)
+        except AttributeError:
+            pass
+
+        resolved = []
+        for typ, ID, _ in stunde.elements:
+            typ == self.typ and resolved.extend(stunde.school.find_param_where(self.parameter, id=ID))
+
+        setattr(stunde, self.slot, resolved)
+        return resolved
 
 
 
 
 class Stunde:
+    __slots__ = ("school", "startDateTime", "endDateTime", "id", "lessonId", "homeWorks", "exam",
+                 "text", "can", "ist", "elements", "_klasse", "_teacher", "_subject", "_room")
+
     school: object
-    api: network.API
 
     # time
     startDateTime: pendulum.datetime
@@ -28,43 +93,58 @@ class Stunde:
     can: str
     ist: str
 
-    # data
+    # raw element references ((type, id, orgId), ...)
+    elements: tuple
 
-    klasse:dict
-    subject:dict
-    teacher:list
-    raum:list
+    # data, resolved on first access
+    klasse = _Elements("CLASS", "klassen")
+    teacher = _Elements("TEACHER", "teachers")
+    subject = _Elements("SUBJECT", "subjects")
+    room = _Elements("ROOM", "rooms")
 
 
 
     def __init__(self, school:object, api:network.API, period):
-        """"""
+        """
+        compact period of a timetable, elements get resolved with school on first access
+        :param school: School used for resolving elements
+        :param api: will get ignored, see Stunde.api
+        :param period: raw period of getTimetable2017
+        """
 
         self.school = school
-        self.api = api
 
-        for key in period.keys() & {"startDateTime","endDateTime","id","lessonId","homeWorks","exam","text","can","ist"}:
+        for key in period.keys() & {"startDateTime","endDateTime","id","lessonId","homeWorks","exam","text","can"}:
             setattr(self, key, period[key])
 
-        # resolve data
-        for element in period["elements"]:
+        "is" in period and setattr(self, "ist", period["is"])
+
+        self.elements = tuple((element["type"], element["id"], element.get("orgId"))
+                              for element in period["elements"])
+
 
-            match element:
-                case {"type": "CLASS"}:
-                    self.klasse = self.school.find_klasses_where(id=element["id"])
-                    break
+    @property
+    def api(self) -> network.API:
+        """api of school"""
+        return self.school.api
 
-                case {"type": "TEACHER"}:
-                    self.teacher = self.school.find_teachers_where(id=element["id"])
-                    break
 
-                case {"type": "SUBJECT"}:
-                    self.subject = self.school.find_subjects_where(id=element["id"])
-                    break
+    @property
+    def start(self) -> int:
+        """startDateTime as seconds since epoch"""
+        return dates.epoch(self.startDateTime)
 
-                case {"type": "ROOM"}:
-                    self.room = self.school.find_rooms_where(id=element["id"])
-                    break
+
+    @property
+    def end(self) -> int:
+        """endDateTime as seconds since epoch"""
+        return dates.epoch(self.endDateTime)
+
+
+    @property
+    def day(self) -> int:
+        """day of period as date ordinal"""
+        return dates.ordinal(self.startDateTime)
 
 
 
@@ -76,6 +156,7 @@ class School:
     address:str = ""
     displayName:str = ""
     schoolID:str = ""
+    schoolData:dict = {}
 
     masterData:dict = {}
     userData:dict = {}
@@ -83,52 +164,244 @@ class School:
 
     # some additional data
 
-    def __init__(self: object, server: str, loginName: str, username: str = "#anonymous#", password: str = "",**kwargs):
+    # largest timetable span in weeks known to work, per (server, loginName)
+    max_span:int = 16
+    spans:dict = {}
+
+    # lookup indexes of masterData, see _index
+    _indexes:dict = {}
+    _indexed:dict = None
+    _years:list = []
+    _years_of:dict = None
+
+    # on disk master data cache, None disables caching
+    cache:pyWebUntis.cache.MasterDataCache = None
+    fetched:float = 0
+
+    def __init__(self: object, server: str, loginName: str, username: str = "#anonymous#", password: str = "",
+                 cache:pyWebUntis.cache.MasterDataCache = None, schoolData:dict = None,
+                 transport:pyWebUntis.transport.Transport = None, **kwargs):
         """
         Init function for School class. Stores only Api related information specific attributes and functions
         :param server: base server url
         :param loginName: identifier name from school
         :param username: username of used default "#anonymous#"
         :param password: password of user default ""
+        :param cache: default None, MasterDataCache to start from, gets revalidated when expired
+        :param schoolData: default None, school from searchSchool, saves the search request
+        :param transport: default shared Transport of server, connection pool, timeouts and retries
         :param kwargs: will get ignored
         """
 
-        self.api = network.API(server=server, loginName=loginName, username=username, password=password)
+        self.api = network.API(server=server, loginName=loginName, username=username, password=password,
+                               transport=transport)
+        self.cache = cache
+
+        if self._load_cache():
+            self.cache.expired(self.fetched) and self.revalidate()
+            return
+
+        self._set_school_data(schoolData or self.api.get_school_data())
+        self._set_user_data(self.api.getUserData())
+        self._store_cache()
+
+
+    @property
+    def server(self) -> str:
+        """server of school, same as SchoolReference.server"""
+        return self.api.server
+
+
+    @property
+    def loginName(self) -> str:
+        """loginName of school, same as SchoolReference.loginName"""
+        return self.api.loginName
+
+
+    def _load_cache(self) -> bool:
+        """
+        loads school data and master data from cache
+        :return: True if cache had an entry
+        """
+
+        entry = self.cache and self.cache.load(self.api.server, self.api.loginName, self.api.username)
+        if not entry:
+            return False
 
-        schoolData = self.api.get_school_data()
+        self._set_school_data(entry["schoolData"])
+        self._set_user_data(entry["userData"])
+        self.fetched = entry["fetched"]
+        return True
 
+
+    def _store_cache(self):
+        """
+        stores school data and master data in cache
+        """
+
+        self.fetched = time.time()
+        self.cache and self.cache.store(self.api.server, self.api.loginName, self.api.username, self.schoolData, {
+            "masterData": self.masterData,
+            "userData": self.userData,
+            "settings": self.settings,
+        })
+
+
+    def _revalidate_args(self) -> dict:
+        """
+        helper function creates a cheap getTimetable request which returns master data changes
+        :return: kwargs for getTimetable, None if school has no klassen
+        """
+
+        if not self.masterData.get("klassen"):
+            return None
+
+        klasse = self.masterData["klassen"][0]
+        today = datetime.date.today()
+
+        return {
+            "startDate": today,
+            "endDate": today,
+            "ID": klasse["id"],
+            "typ": "CLASS",
+            "masterDataTimestamp": self.masterData.get("timeStamp", 0),
+        }
+
+
+    def _apply_revalidation(self, result:dict):
+        """
+        merges master data changes of a getTimetable answer and updates cache
+        :param result: answer of getTimetable2017
+        """
+
+        self.merge_master_data(result.get("masterData") or {})
+        self._store_cache()
+
+
+    def revalidate(self):
+        """
+        checks with one small timetable request if master data changed since it was loaded
+        falls back to getUserData if the user may not read the timetable, keeps the cached data if both fail
+        """
+
+        args = self._revalidate_args()
+        if args is not None:
+            try:
+                self._apply_revalidation(self.api.getTimetable(**args))
+                return
+            except pyWebUntis.error.UntisError:
+                pass
+
+        try:
+            self._set_user_data(self.api.getUserData())
+        except pyWebUntis.error.UntisError:
+            return
+
+        self._store_cache()
+
+
+    def merge_master_data(self, masterData:dict):
+        """
+        merges changed master data entries by id
+        builds a new dict and new lists, masterData can be shared with other schools by coalesced requests
+        :param masterData: masterData with changed entries and timeStamp
+        """
+
+        merged = dict(self.masterData)
+        for key, entries in masterData.items():
+            if not isinstance(entries, list) or not isinstance(merged.get(key), list):
+                continue
+
+            current = merged[key] = list(merged[key])
+            known = {entry.get("id"): i for i, entry in enumerate(current)}
+            for entry in entries:
+                if entry.get("id") in known:
+                    current[known[entry.get("id")]] = entry
+                else:
+                    current.append(entry)
+
+        if masterData.get("timeStamp"):
+            merged["timeStamp"] = masterData["timeStamp"]
+
+        self.masterData = merged
+        self._indexed = None
+        self._years_of = None
+
+
+    def _set_school_data(self, schoolData:dict):
+        """
+        stores the school search result
+        :param schoolData: dict of school from searchSchool
+        """
+
+        self.schoolData = schoolData
         self.address = schoolData["address"]
         self.displayName = schoolData["displayName"]
         self.schoolID = schoolData["schoolId"]
 
-        result = self.api.getUserData()
+
+    def _set_user_data(self, result:dict):
+        """
+        stores the result of getUserData2017
+        :param result: dict with masterData, userData and settings
+        """
+
         self.masterData = result["masterData"]
         self.userData = result["userData"]
         self.settings = result["settings"]
 
 
     # klassen funktionen
+    def _index(self, parameter:str, key:str) -> dict:
+        """
+        gets index of masterData list by key, builds it on first usage
+        indexes get dropped when masterData is replaced or merged
+        :param parameter: key of masterData list
+        :param key: key in entries of list
+        :return: dict {value: [entry, ...]}
+        """
+
+        if self._indexed is not self.masterData:
+            self._indexes = {}
+            self._indexed = self.masterData
+
+        index = self._indexes.get((parameter, key))
+        if index is None:
+            index = {}
+            for param in self.masterData[parameter]:
+                key in param and index.setdefault(param[key], []).append(param)
+
+            self._indexes[(parameter, key)] = index
+
+        return index
+
+
     def find_param_where(self, parameter:str, **kwargs) -> list[dict]:
         """
         finds any key in masterData dict
+        only returns entries where all kwargs match
         :param parameter: key which will be used in masterData for searching
         :param kwargs: arguments which to check
         :return: list of dicts
         """
 
-        returning = []
-        for param in self.masterData[parameter]:
-
-            keys = param.keys() & kwargs.keys()
-            for key in keys:
-                if not param[key] == kwargs[key]:
-                    continue
+        if not kwargs:
+            return []
 
-                returning.append(param)
-
-        return returning
+        # look up the first hashable argument, check remaining arguments on its few hits
+        for key, value in kwargs.items():
+            try:
+                returning = self._index(parameter, key).get(value, [])
+            except TypeError:
+                continue
 
+            break
+        else:
+            returning = self.masterData[parameter]
 
+        missing = object()
+        return [param for param in returning
+                if all(param.get(k, missing) == v for k, v in kwargs.items())]
 
 
     def find_subjects_where(self, **options) -> list[dict]:
@@ -145,7 +418,6 @@ class School:
     def find_klasses_where(self, **kwargs)  -> list[dict]:
         """
         Find klasse by parameter given in kwargs
-        if key not in klasse dict key gets ignored
         only returns klasse dict when all args matched
         :param kwargs: key=val
         :return: [] or [klasse, klasse]
@@ -180,73 +452,192 @@ class School:
         :return:
         """
 
-        date = pendulum.instance(date)
-        args = {'ID': 5505, 'typ': 'CLASS', 'endDate': '2024-3-10', 'startDate': '2024-03-04'}
-        result = self.api.getTimetable(**args)
-        timetable = result["timetable"]
+        startDate, endDate = self.api._getMoSofromDate(_to_date(date))
+        result = self.api.getTimetable(startDate=startDate, endDate=endDate, ID=ID, typ=typ)
+        return self._sort_week(result["timetable"])
+
+
+    def _sort_week(self, timetable:dict) -> dict:
+        """
+        sorts periods of timetable in days
+        :param timetable: timetable dict of getTimetable2017
+        :return: dict {Mon: [Stunde, ...], ...}
+        """
 
         #check if timetable has any data
         if not timetable["periods"]:
             return {}
 
         # sort timetable date
-        week = {}
-        for i in range(1,8):
-            week[f"{pendulum.date(1,1,i):%a}"] = []
+        week = {day: [] for day in dates.WEEKDAYS}
 
         for period in timetable["periods"]:
-            day = pendulum.parse(period['startDateTime'])
-            day = f"{ day:%a}"
+            day = dates.WEEKDAYS[dates.weekday(period['startDateTime'])]
 
             week[day].append(Stunde(self, self.api, period))
 
         return week
 
-    def get_current_school_year(self) -> dict:
-        """"""
+    def get_timetable_range(self, ID:Union[int,str], typ:str, startDate:pendulum.date, endDate:pendulum.date) -> dict:
+        """
+        get timetable of a date range in as few requests as possible, sorted in weeks and days
+        The span of one request gets halved when the server answers with TooManyResults,
+        the largest working span is remembered for the school.
+        :param ID: ID of class | Student | ...
+        :param typ: Type CLASS | STUDENT | ...
+        :param startDate: any day in first week
+        :param endDate: any day in last week
+        :return: dict {"YYYY-MM-DD" of monday: {Mon: [Stunde, ...], ...}}
+        """
+
+        key = (self.api.server, self.api.loginName)
+        span = self.spans.get(key, self.max_span)
+
+        current, _ = self.api._getMoSofromDate(_to_date(startDate))
+        _, last = self.api._getMoSofromDate(_to_date(endDate))
+
+        periods = []
+        while current <= last:
+            end = min(current.add(weeks=span, days=-1), last)
+
+            try:
+                result = self.api.getTimetable(startDate=current, endDate=end, ID=ID, typ=typ)
+            except pyWebUntis.error.UntisError as error:
+                if error.name != "TooManyResults" or span == 1:
+                    raise
 
-        today = pendulum.today()
-        conver = lambda date: pendulum.parse(date)
+                span = span // 2
+                continue
+
+            self.spans[key] = span
+            periods.extend(result["timetable"]["periods"])
+            current = end.add(days=1)
+
+        first, _ = self.api._getMoSofromDate(_to_date(startDate))
+        return self._split_weeks(periods, first, last)
+
+
+    def _split_weeks(self, periods:list, monday:pendulum.date, sunday:pendulum.date) -> dict:
+        """
+        splits periods of multiple weeks in weeks sorted in days
+        :param periods: list of raw periods
+        :param monday: monday of first week
+        :param sunday: sunday of last week
+        :return: dict {"YYYY-MM-DD" of monday: {Mon: [Stunde, ...], ...}}
+        """
 
-        for year in self.masterData["schoolyears"]:
-            start = conver( year["startDate"] )
-            end = conver( year["endDate"] )
-            interval = pendulum.Interval(start, end)
+        weeks = {}
+        for monday, _ in self.api.date_iter(start=monday, end=sunday):
+            weeks[f"{monday:%Y-%m-%d}"] = []
 
-            if today in interval:
+        for period in periods:
+            weeks.setdefault(dates.monday(period['startDateTime']), []).append(period)
+
+        return {monday: self._sort_week({"periods": week}) for monday, week in weeks.items()}
+
+
+    def get_current_school_year(self) -> dict:
+        """
+        finds school year of today
+        :return: dict of masterData["schoolyears"] or None
+        """
+
+        today = datetime.date.today().toordinal()
+
+        for start, end, year in self._school_years():
+            if start <= today <= end:
                 return year
 
 
+    def _school_years(self) -> list[tuple[int, int, dict]]:
+        """
+        school years as day ordinals, parsed once per masterData
+        :return: list of (start, end, year)
+        """
+
+        if self._years_of is not self.masterData:
+            self._years = [(dates.ordinal(year["startDate"]), dates.ordinal(year["endDate"]), year)
+                           for year in self.masterData["schoolyears"]]
+            self._years_of = self.masterData
+
+        return self._years
 
 
-    def find_next_school_week(self, ID:str, typ:str, iter:bool=False) -> dict:
+
+
+    def _resolve_periods(self, result:dict) -> dict:
+        """
+        copies a getTimetable2017 answer with Stunde objects instead of raw periods
+        the answer itself is not changed, it can be shared with other callers
+        :param result: answer of getTimetable2017
+        :return: copy of result
         """
-        finds next school week and return raw dict with timetable data
+
+        data = result["timetable"]
+        periods = [Stunde(self, self.api, element) for element in data["periods"]]
+
+        return {**result, "timetable": {**data, "periods": periods}}
+
+
+    def _fetch_weeks(self, ID:str, typ:str, workers:int=1):
+        """
+        fetches the weeks from today until end of current school year
+        with up to `workers` requests in flight, results are yielded in date order
         :param ID: id
         :param typ: type
-        :param iter: default False, if shoud iter until last date of year
-        :return: dict
+        :param workers: default 1, count of concurrent requests
+        :return: generator of getTimetable2017 answers
         """
 
+        import pendulum
+
         year = self.get_current_school_year()
         endDate = pendulum.parse(year["endDate"])
+        weeks = self.api.date_iter(end= endDate)
 
-        for start, end in self.api.date_iter(end= endDate):
-            result = self.api.getTimetable(start, end, ID=ID, typ=typ)
+        if workers <= 1:
+            for start, end in weeks:
+                yield self.api.getTimetable(start, end, ID=ID, typ=typ)
+            return
 
-            if result["timetable"]["periods"]:
-                data = result["timetable"]
+        # sliding window of futures, the oldest week is always consumed first
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        pending = collections.deque()
+        try:
+            for start, end in itertools.islice(weeks, workers):
+                pending.append(pool.submit(self.api.getTimetable, start, end, ID=ID, typ=typ))
 
-                for i, element in enumerate(data["periods"]):
-                    data["periods"][i] = Stunde(self, self.api, element)
+            while pending:
+                result = pending.popleft().result()
 
-                if iter:
-                    yield result
-                else:
-                    return result
+                for start, end in itertools.islice(weeks, 1):
+                    pending.append(pool.submit(self.api.getTimetable, start, end, ID=ID, typ=typ))
 
-        if not iter:
-            return {}
+                yield result
+
+        finally:
+            # consumer stopped early, drop weeks which are not needed anymore
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+    def find_next_school_week(self, ID:str, typ:str, iter:bool=False, workers:int=1):
+        """
+        finds next school week and yields raw dict with timetable data
+        :param ID: id
+        :param typ: type
+        :param iter: default False, if shoud iter until last date of year
+        :param workers: default 1, count of weeks which get fetched concurrently
+        :return: generator of dicts, only the first school week if iter is False
+        """
+
+        with contextlib.closing(self._fetch_weeks(ID, typ, workers=workers)) as weeks:
+            for result in weeks:
+
+                if result["timetable"]["periods"]:
+                    yield self._resolve_periods(result)
+
+                    if not iter:
+                        return
 
 
     def find_last_week(self, klassID:str):
@@ -255,23 +646,96 @@ class School:
 
 
 
-def search_school(query: str):
+class SchoolReference:
+    """
+    Lightweight school from a search result.
+    Holds only the search data, the School with master data and user data gets created on first access
+    of any other attribute.
+    """
+
+    # search data
+    server:str
+    loginName:str
+    address:str
+    displayName:str
+    schoolID:str
+
+
+    def __init__(self, schoolData:dict, **kwargs):
+        """
+        Init function for SchoolReference class.
+        :param schoolData: school from searchSchool
+        :param kwargs: passed to School, e.g. username, password, cache
+        """
+
+        self.schoolData = schoolData
+        self.server = schoolData["server"]
+        self.loginName = schoolData["loginName"]
+        self.address = schoolData["address"]
+        self.displayName = schoolData["displayName"]
+        self.schoolID = schoolData["schoolId"]
+
+        self._kwargs = kwargs
+        self._school = None
+        self._lock = threading.Lock()
+
+
+    @property
+    def loaded(self) -> bool:
+        """True if School is already created"""
+        return self._school is not None
+
+
+    @property
+    def school(self) -> School:
+        """
+        gets School, creates it on first access
+        :return: School
+        """
+
+        if self._school is None:
+            with self._lock:
+                if self._school is None:
+                    self._school = School(**{**self.schoolData, **self._kwargs}, schoolData=self.schoolData)
+
+        return self._school
+
+
+    def __getattr__(self, name):
+        # only called for attributes not defined above
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        return getattr(self.school, name)
+
+
+    def __repr__(self) -> str:
+        return f"SchoolReference({self.loginName!r}, {self.displayName!r})"
+
+
+
+def prefetch(schools:list[SchoolReference], workers:int=8) -> list[School]:
+    """
+    Loads schools of a search concurrently
+    :param schools: picked SchoolReference objects
+    :param workers: default 8, count of concurrent loads
+    :return: list of School in same order
+    """
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda school: school.school, schools))
+
+
+
+def search_school(query: str, **kwargs):
     """
     Search school with the given string.
+    Results are cached, see pyWebUntis.search.SchoolSearch
     :param query: String with search querry
-    :return: list with school objects
+    :param kwargs: passed to School on first access, e.g. cache
+    :return: list with SchoolReference objects
+    :raise UntisError with TooManyResults when query is not specific enough
     """
-    baseurl = "https://schoolsearch.webuntis.com/schoolquery2"
-    json = {
-        "id": f"blackberry",
-        "jsonrpc": "2.0",
-        "method": "searchSchool",
-        "params": [{
-            "search": f"{query}"
-        }]
-    }
-
-    data = requests.post(url=baseurl, json=json)
-    data = data.json()
-    schools = [School(**result) for result in data["result"]["schools"]]
+
+    schools = [SchoolReference(result, **kwargs) for result in pyWebUntis.search.default.search(query)]
     return schools
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Union
+
+from pyWebUntis import network
+
+if TYPE_CHECKING:
+    import pendulum
+
+
+
+
+class Week:
+    """
+    Local copy of one week timetable of one element
+    """
+
+    __slots__ = ("timestamp", "timestamps", "days")
+
+    def __init__(self):
+        self.timestamp: int = 0
+        self.timestamps: list[int] = [0] * 7
+        self.days: list[list[dict]] = [[] for _ in range(7)]
+
+
+    @property
+    def periods(self) -> list[dict]:
+        """
+        all periods of week in day order
+        :return: list of raw periods
+        """
+
+        return [period for day in self.days for period in day]
+
+
+
+
+class TimetableSync:
+    """
+    Incremental timetable sync.
+    Stores the timetableTimestamps returned for every (element, week), sends them back on the next
+    request and only replaces the days the server reports as changed.
+    """
+
+    api: network.API
+    weeks: dict[tuple[str, str, str], Week]
+
+
+    def __init__(self, api: network.API):
+        """
+        Init function for TimetableSync class.
+        :param api: api of school
+        """
+
+        self.api = api
+        self.weeks = {}
+        self._lock = threading.Lock()
+
+
+    def week(self, ID: Union[int, str], typ: str, date: pendulum.date) -> Week:
+        """
+        gets local copy of week, empty if it never got synced
+        :param ID: ID of class | Student | ...
+        :param typ: Type CLASS | STUDENT | ...
+        :param date: any day in week
+        :return: Week
+        """
+
+        monday, _ = self.api._getMoSofromDate(date)
+        key = (typ, f"{ID}", f"{monday:%Y-%m-%d}")
+
+        with self._lock:
+            return self.weeks.setdefault(key, Week())
+
+
+    def forget(self, before: pendulum.date):
+        """
+        Drops local copies of weeks before date
+        :param before: e.g. monday of current week
+        """
+
+        limit = f"{before:%Y-%m-%d}"
+        with self._lock:
+            for key in [key for key in self.weeks if key[2] < limit]:
+                del self.weeks[key]
+
+
+    def refresh(self, ID: Union[int, str], typ: str, date: pendulum.date) -> list[int]:
+        """
+        syncs week with server
+        :param ID: ID of class | Student | ...
+        :param typ: Type CLASS | STUDENT | ...
+        :param date: any day in week
+        :return: list of changed weekdays, 0 is monday
+        """
+
+        monday, sunday = self.api._getMoSofromDate(date)
+        week = self.week(ID, typ, monday)
+
+        result = self.api.getTimetable(monday, sunday, ID=ID, typ=typ,
+                                       timetableTimestamp=week.timestamp,
+                                       timetableTimestamps=week.timestamps)
+        return self.merge(week, monday, result["timetable"])
+
+
+    @staticmethod
+    def merge(week: Week, monday: pendulum.date, timetable: dict) -> list[int]:
+        """
+        merges the changed days of a getTimetable2017 answer into week
+        :param week: local copy of week
+        :param monday: monday of week
+        :param timetable: timetable dict of getTimetable2017
+        :return: list of changed weekdays, 0 is monday
+        """
+
+        timestamps = timetable.get("timetableTimestamps")
+
+        # server gave no timestamps, every day is new
+        if not timestamps or len(timestamps) != 7:
+            changed = list(range(7))
+        else:
+            changed = [i for i in range(7) if timestamps[i] != week.timestamps[i]]
+
+        if not changed:
+            return changed
+
+        # bucket by date prefix of startDateTime, avoids parsing every period
+        dates = {f"{monday.add(days=i):%Y-%m-%d}": i for i in changed}
+        days = {i: [] for i in changed}
+
+        for period in timetable["periods"]:
+            day = dates.get(period["startDateTime"][:10])
+            day is not None and days[day].append(period)
+
+        for i, periods in days.items():
+            week.days[i] = periods
+
+        week.timestamp = timetable.get("timetableTimestamp", week.timestamp)
+        if timestamps and len(timestamps) == 7:
+            week.timestamps = list(timestamps)
+
+        return changed
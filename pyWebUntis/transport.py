@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import pyWebUntis.codec
+import pyWebUntis.error
+import pyWebUntis.limiter
+import pyWebUntis.metrics
+
+# requests is imported on first use, see Transport.session
+if TYPE_CHECKING:
+    import requests
+
+
+
+
+class Transport:
+    """
+    HTTP transport of one or many API instances.
+    Owns a requests.Session with its own connection pool, timeouts and retry policy.
+    Use Transport.for_server to share one transport between all API of a server.
+    The session is created on first use. Every request passes the Limiter of the transport,
+    a token bucket and circuit breaker, see pyWebUntis.limiter.
+    """
+
+    headers = {
+        "content-type": "application/json; charset=UTF-8",
+        "accept-encoding": "gzip",
+        "user-agent": "okhttp/4.11.0"
+    }
+
+    # retry policy
+    retry_status = {429, 500, 502, 503, 504}
+    retry_codes = {"-8998"}  # UnspecifiedError, auth errors are never retried
+
+    # transports shared per server, see for_server
+    _servers: dict = {}
+    _lock = threading.Lock()
+
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10,
+                 connect_timeout: float = 5, read_timeout: float = 30, keep_alive: bool = True,
+                 retries: int = 3, backoff: float = 0.5, backoff_max: float = 10,
+                 codec: pyWebUntis.codec.Codec = None, limiter: pyWebUntis.limiter.Limiter = None):
+        """
+        Init function for Transport class.
+        :param pool_connections: default 10, count of hosts pools are kept for
+        :param pool_maxsize: default 10, max open connections per host
+        :param connect_timeout: default 5, seconds until connecting fails
+        :param read_timeout: default 30, seconds until waiting for data fails
+        :param keep_alive: default True, False closes connection after every request
+        :param retries: default 3, count of retries for transient errors
+        :param backoff: default 0.5, seconds of first backoff, doubled on every retry
+        :param backoff_max: default 10, max seconds of one backoff
+        :param codec: default fastest installed json codec, see pyWebUntis.codec
+        :param limiter: default Limiter with default rate, see pyWebUntis.limiter
+        """
+
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.pool_maxsize = pool_maxsize
+        self.codec = codec or pyWebUntis.codec.default
+        self.limiter = limiter or pyWebUntis.limiter.Limiter()
+
+        self.pool_connections = pool_connections
+        self.keep_alive = keep_alive
+        self._session = None
+
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        requests.Session with the connection pool, requests is imported on first access
+        """
+
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+
+        return self._session
+
+
+    def _create_session(self) -> requests.Session:
+        import requests.adapters
+
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+
+        session = requests.Session()
+        session.headers = dict(self.headers)
+        self.keep_alive or session.headers.update({"connection": "close"})
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+
+    @classmethod
+    def for_server(cls, server: str, **config) -> "Transport":
+        """
+        Gets the shared transport of server, creates it with config if needed
+        :param server: base server url
+        :param config: arguments for Transport, only used on creation
+        :return: Transport
+        """
+
+        with cls._lock:
+            transport = cls._servers.get(server)
+            if transport is None:
+                transport = cls._servers[server] = cls(**config)
+                transport.limiter.server = transport.limiter.server or server
+
+        return transport
+
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends one request with timeouts
+        :param method: GET | POST
+        :param url: url
+        :param kwargs: arguments for requests.Session.request
+        :return: requests.Response
+        :raise requests.HTTPError for status codes which can be retried
+        """
+
+        kwargs.setdefault("timeout", self.timeout)
+        response = self.session.request(method, url, **kwargs)
+
+        if response.status_code in self.retry_status:
+            import requests
+            raise requests.HTTPError(f"{response.status_code} for url {url}", response=response)
+
+        return response
+
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+
+    def post_json(self, url: str, json, **kwargs):
+        """
+        Sends json body with codec and decodes answer
+        :param url: url
+        :param json: body
+        :param kwargs: arguments for requests.Session.request
+        :return: decoded answer
+        """
+
+        data = self.codec.dumps(json)
+        pyWebUntis.metrics.current().set("request_bytes", len(data))
+
+        response = self.post(url, data=data, **kwargs)
+        return self.decode(response)
+
+
+    def get_json(self, url: str, **kwargs):
+        """
+        Sends get request and decodes answer with codec
+        :param url: url
+        :param kwargs: arguments for requests.Session.request
+        :return: decoded answer
+        """
+
+        response = self.get(url, **kwargs)
+        return self.decode(response)
+
+
+    def decode(self, response: requests.Response):
+        """
+        Decodes answer with codec, records size and decode time on active span
+        :param response: requests.Response
+        :return: decoded answer
+        """
+
+        span = pyWebUntis.metrics.current()
+        if span is pyWebUntis.metrics.NOOP:
+            return self.codec.loads(response.content)
+
+        content = response.content
+        span.set("status", response.status_code)
+        span.set("response_bytes", len(content))
+
+        start = time.perf_counter()
+        result = self.codec.loads(content)
+        span.set("decode_ms", (time.perf_counter() - start) * 1000)
+
+        return result
+
+
+    # retry
+    def _delay(self, attempt: int, error: BaseException, transient: tuple) -> float:
+        """
+        helper function checks if error is transient and calculates backoff
+        :param attempt: count of failed attempts
+        :param error: raised error
+        :param transient: exception types which can be retried
+        :return: seconds to wait or None if error should be raised
+        """
+
+        if attempt > self.retries:
+            return None
+
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None) or getattr(error, "status", None)
+
+        if isinstance(error, pyWebUntis.error.UntisError):
+            retry = error.code in self.retry_codes
+        else:
+            retry = status in self.retry_status or (status is None and isinstance(error, transient))
+
+        if not retry:
+            return None
+
+        # full jitter, spreads retries of many workers
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1)))
+
+        # server told when to come back
+        headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+        after = headers.get("retry-after", "")
+        after.isdigit() and (delay := max(delay, min(float(after), self.backoff_max)))
+
+        return delay
+
+
+    def limited(self, function, *args, **kwargs):
+        """
+        calls function once, waits for the limiter and records the result
+        :param function: function which sends one request
+        :return: result of function
+        :raise ServerUnavailable while the circuit of the server is open
+        """
+
+        delay = self.limiter.reserve()
+        delay and time.sleep(delay)
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as error:
+            self.limiter.record(error)
+            raise
+
+        self.limiter.record()
+        return result
+
+
+    async def alimited(self, function, *args, **kwargs):
+        """
+        asyncio version of limited
+        :param function: coroutine function which sends one request
+        :return: result of function
+        """
+
+        import asyncio
+
+        delay = self.limiter.reserve()
+        delay and await asyncio.sleep(delay)
+
+        try:
+            result = await function(*args, **kwargs)
+        except BaseException as error:
+            self.limiter.record(error)
+            raise
+
+        self.limiter.record()
+        return result
+
+
+    def retry(self, function, *args, **kwargs):
+        """
+        calls function through the limiter and retries it with jittered backoff on transient errors
+        :param function: function which sends one request
+        :return: result of function
+        """
+
+        import requests
+
+        transient = (requests.ConnectionError, requests.Timeout)
+
+        attempt = 0
+        while True:
+            try:
+                return self.limited(function, *args, **kwargs)
+            except (requests.RequestException, pyWebUntis.error.UntisError) as error:
+                attempt += 1
+                delay = self._delay(attempt, error, transient)
+                if delay is None:
+                    raise
+
+            pyWebUntis.metrics.current().add("retries")
+            time.sleep(delay)
+
+
+    async def aretry(self, function, *args, transient: tuple = (), **kwargs):
+        """
+        asyncio version of retry
+        :param function: coroutine function which sends one request
+        :param transient: exception types of http client which can be retried
+        :return: result of function
+        """
+
+        import asyncio
+
+        transient = (asyncio.TimeoutError, *transient)
+
+        attempt = 0
+        while True:
+            try:
+                return await self.alimited(function, *args, **kwargs)
+            except (*transient, pyWebUntis.error.UntisError) as error:
+                attempt += 1
+                delay = self._delay(attempt, error, transient)
+                if delay is None:
+                    raise
+
+            pyWebUntis.metrics.current().add("retries")
+            await asyncio.sleep(delay)
@@ -0,0 +1,81 @@
+import concurrent.futures
+import threading
+
+
+
+
+class SingleFlight:
+    """
+    Shares one call between all threads asking for the same key at the same time.
+    The first caller runs the function, everyone else waits for its result or error.
+    """
+
+    def __init__(self):
+        self._calls: dict[object, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        calls function or waits for the running call with same key
+        :param key: hashable key of call
+        :param function: function to call
+        :return: result of function
+        """
+
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = self._calls[key] = concurrent.futures.Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as error:
+            with self._lock:
+                del self._calls[key]
+            future.set_exception(error)
+            raise
+
+        with self._lock:
+            del self._calls[key]
+        future.set_result(result)
+
+        return result
+
+
+
+
+class AsyncSingleFlight:
+    """
+    asyncio version of SingleFlight, shares one task between all coroutines asking for the same key.
+    The task keeps running if a waiting coroutine gets cancelled.
+    """
+
+    def __init__(self):
+        # (event loop, key): task
+        self._calls: dict[tuple, object] = {}
+
+
+    async def do(self, key, function, *args, **kwargs):
+        """
+        awaits coroutine function or the running call with same key
+        :param key: hashable key of call
+        :param function: coroutine function to call
+        :return: result of function
+        """
+
+        import asyncio
+
+        # tasks belong to one event loop
+        key = (asyncio.get_running_loop(), key)
+
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(function(*args, **kwargs))
+            task.add_done_callback(lambda done: self._calls.get(key) is done and self._calls.pop(key))
+
+        return await asyncio.shield(task)
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING, Union
+
+import pyWebUntis.error
+import pyWebUntis.metrics
+from pyWebUntis import network, sync
+
+if TYPE_CHECKING:
+    import pendulum
+
+
+
+
+class Change:
+    """
+    One change of a period between two polls
+    kind: CANCELLATION | SUBSTITUTION | ROOM | ADDED | REMOVED | CHANGED
+    """
+
+    CANCELLATION = "cancellation"
+    SUBSTITUTION = "substitution"
+    ROOM = "room"
+    ADDED = "added"
+    REMOVED = "removed"
+    # anything else, e.g. text or homework
+    CHANGED = "changed"
+
+    __slots__ = ("kind", "ID", "typ", "period", "old")
+
+    def __init__(self, kind: str, ID: str, typ: str, period: dict, old: dict = None):
+        self.kind = kind
+        self.ID = ID
+        self.typ = typ
+        # raw periods, period is the old one for REMOVED, old is None for ADDED
+        self.period = period
+        self.old = old
+
+
+    def __repr__(self) -> str:
+        return f"Change({self.kind!r}, {self.typ} {self.ID}, period={self.period.get('id')}, {self.period.get('startDateTime')})"
+
+
+
+
+def _elements(period: dict, typ: str) -> tuple:
+    return tuple(sorted(element["id"] for element in period.get("elements", ()) if element["type"] == typ))
+
+
+def fingerprint(period: dict) -> int:
+    """
+    cheap hash of the fields of a period which can change
+    :param period: raw period of getTimetable2017
+    :return: int
+    """
+
+    text = period.get("text") or {}
+    return hash((
+        period.get("startDateTime"),
+        period.get("endDateTime"),
+        tuple(period.get("is") or ()),
+        tuple(period.get("can") or ()),
+        tuple((element["type"], element["id"], element.get("orgId"), element.get("state"))
+              for element in period.get("elements", ())),
+        tuple(text.items()) if isinstance(text, dict) else text,
+        len(period.get("homeWorks") or ()),
+        period.get("exam") is not None,
+    ))
+
+
+def classify(old: dict, new: dict) -> list[str]:
+    """
+    kinds of change between two versions of a period with different fingerprint
+    :param old: raw period of last poll
+    :param new: raw period
+    :return: list of Change kinds, CHANGED if nothing specific changed
+    """
+
+    was, state = set(old.get("is") or ()), set(new.get("is") or ())
+    kinds = []
+
+    if "CANCELLED" in state and "CANCELLED" not in was:
+        kinds.append(Change.CANCELLATION)
+
+    if ("SUBSTITUTION" in state and "SUBSTITUTION" not in was
+            or _elements(old, "TEACHER") != _elements(new, "TEACHER")
+            or _elements(old, "SUBJECT") != _elements(new, "SUBJECT")):
+        kinds.append(Change.SUBSTITUTION)
+
+    if ("ROOM_SUBSTITUTION" in state and "ROOM_SUBSTITUTION" not in was
+            or _elements(old, "ROOM") != _elements(new, "ROOM")):
+        kinds.append(Change.ROOM)
+
+    return kinds or [Change.CHANGED]
+
+
+
+
+class Watcher:
+    """
+    Polls timetables and reports changed periods.
+    Built on sync.TimetableSync, only days the server reports as changed get diffed. A day is kept as
+    {period id: (fingerprint, period)}, so a diff is one hash per period and a lookup per id.
+    The first poll of a week only stores it. A week which fails to poll, e.g. ServerUnavailable or a
+    timeout, is backed off like a quiet week and does not stop the others.
+    Polling adapts: the current week is polled every intervals[0] seconds, the next week every
+    intervals[1] and later weeks every intervals[2]. Every poll without changes doubles the interval
+    of that week up to max_backoff times, a change resets it.
+    There is no own interval of the current day: TimetableSync fetches and diffs whole weeks with the
+    timestamps of the server, so today is polled with the current week at intervals[0].
+    usage:
+        watcher = Watcher(school.api)
+        watcher.watch(klasse_id, "CLASS", weeks=3)
+        for change in watcher.run():
+            ...
+    """
+
+    # seconds between polls of current week (including today), next week and later weeks
+    intervals: tuple = (60, 600, 3600)
+    max_backoff: int = 4
+
+    api: network.API
+    sync: sync.TimetableSync
+
+
+    def __init__(self, api: network.API, timetable_sync: sync.TimetableSync = None):
+        """
+        Init function for Watcher class.
+        :param api: api of school
+        :param timetable_sync: default new TimetableSync of api
+        """
+
+        self.api = api
+        self.sync = timetable_sync or sync.TimetableSync(api)
+
+        # (typ, ID, week offset): [due, backoff]
+        self._targets: dict[tuple[str, str, int], list] = {}
+        # (typ, ID, monday): list of 7 days {period id: (fingerprint, period)}, None if never polled
+        self._snapshots: dict[tuple[str, str, str], list[dict]] = {}
+        self._lock = threading.Lock()
+
+
+    def watch(self, ID: Union[int, str], typ: str, weeks: int = 1):
+        """
+        Adds element, due at once
+        :param ID: ID of class | Student | ...
+        :param typ: Type CLASS | STUDENT | ...
+        :param weeks: default 1, count of weeks starting with the current week
+        """
+
+        with self._lock:
+            for offset in range(weeks):
+                self._targets.setdefault((typ, f"{ID}", offset), [0.0, 1])
+
+
+    def unwatch(self, ID: Union[int, str], typ: str):
+        with self._lock:
+            for key in [key for key in self._targets if key[:2] == (typ, f"{ID}")]:
+                del self._targets[key]
+
+
+    def interval(self, offset: int, backoff: int = 1) -> float:
+        """
+        :param offset: weeks from current week
+        :param backoff: factor of quiet polls
+        :return: seconds between polls
+        """
+
+        return self.intervals[min(offset, len(self.intervals) - 1)] * backoff
+
+
+    def next_poll(self) -> float:
+        """
+        :return: seconds until the next week is due, 0 if one is due
+        """
+
+        with self._lock:
+            due = min((due for due, _ in self._targets.values()), default=None)
+
+        if due is None:
+            return None
+
+        return max(0.0, due - time.monotonic())
+
+
+    def poll(self, force: bool = False) -> list[Change]:
+        """
+        Polls all due weeks
+        :param force: default False, poll every week
+        :return: list of Change
+        """
+
+        import pendulum
+
+        today = pendulum.today()
+        now = time.monotonic()
+
+        with self._lock:
+            due = [key for key, (at, _) in self._targets.items() if force or at <= now]
+
+        changes = []
+        for typ, ID, offset in due:
+            try:
+                found = self._poll(ID, typ, today.add(weeks=offset))
+            except (pyWebUntis.error.UntisError, OSError) as error:
+                # includes errors of requests, polled again after the backoff
+                code = getattr(error, "code", None) or type(error).__name__
+                pyWebUntis.metrics.registry.count("untis.watch.errors", typ=typ, code=code)
+                found = []
+
+            with self._lock:
+                target = self._targets.get((typ, ID, offset))
+                if target is None:
+                    continue
+
+                target[1] = 1 if found else min(target[1] * 2, self.max_backoff)
+                target[0] = time.monotonic() + self.interval(offset, target[1])
+
+            changes.extend(found)
+
+        return changes
+
+
+    def _poll(self, ID: str, typ: str, date: pendulum.date) -> list[Change]:
+        """
+        helper function refreshes one week and diffs its changed days
+        """
+
+        monday, _ = self.api._getMoSofromDate(date)
+        key = (typ, ID, f"{monday:%Y-%m-%d}")
+
+        changed = self.sync.refresh(ID, typ, monday)
+        week = self.sync.week(ID, typ, monday)
+
+        snapshot = self._snapshots.get(key)
+        first = snapshot is None
+        if first:
+            snapshot = self._snapshots[key] = [{} for _ in range(7)]
+
+        changes = []
+        for day in changed:
+            current = {period["id"]: (fingerprint(period), period) for period in week.days[day]}
+            first or changes.extend(self.diff(ID, typ, snapshot[day], current))
+            snapshot[day] = current
+
+        return changes
+
+
+    @staticmethod
+    def diff(ID: str, typ: str, old: dict, new: dict) -> list[Change]:
+        """
+        Compares two versions of a day
+        :param old: {period id: (fingerprint, period)}
+        :param new: {period id: (fingerprint, period)}
+        :return: list of Change
+        """
+
+        changes = []
+        for id, (hashed, period) in new.items():
+            before = old.get(id)
+            if before is None:
+                changes.append(Change(Change.ADDED, ID, typ, period))
+            elif before[0] != hashed:
+                changes.extend(Change(kind, ID, typ, period, before[1]) for kind in classify(before[1], period))
+
+        for id, (_, period) in old.items():
+            id in new or changes.append(Change(Change.REMOVED, ID, typ, period))
+
+        return changes
+
+
+    def forget(self, before: pendulum.date):
+        """
+        Drops snapshots and synced weeks before date
+        :param before: e.g. monday of current week
+        """
+
+        limit = f"{before:%Y-%m-%d}"
+        with self._lock:
+            for key in [key for key in self._snapshots if key[2] < limit]:
+                del self._snapshots[key]
+
+        self.sync.forget(before)
+
+
+    def run(self, stop: threading.Event = None):
+        """
+        Polls forever, sleeps until the next week is due
+        :param stop: default None, set to end the generator
+        :return: generator of Change
+        """
+
+        import pendulum
+
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            yield from self.poll()
+
+            # weeks which passed are not polled anymore
+            monday, _ = self.api._getMoSofromDate(pendulum.today())
+            self.forget(monday)
+
+            wait = self.next_poll()
+            stop.wait(wait if wait is not None else self.intervals[0])